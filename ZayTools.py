@@ -5,6 +5,12 @@ from .lib import fusion360utils as futil
 
 def run(context):
     try:
+        # Memory tracking only starts if it is enabled in config.py.
+        futil.start_memory_tracking()
+
+        # Event recording only starts if it is enabled in config.py.
+        futil.start_event_recording()
+
         # This will run the start function in each of your commands as defined in commands/__init__.py
         commands.start()
 
@@ -19,6 +25,10 @@ def stop(context):
 
         # This will run the start function in each of your commands as defined in commands/__init__.py
         commands.stop()
+        futil.clear_panels()
+
+        futil.stop_memory_tracking()
+        futil.stop_event_recording()
 
     except:
         futil.handle_error('stop')
\ No newline at end of file
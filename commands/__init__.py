@@ -6,13 +6,17 @@
 from .commandDialog import entry as commandDialog
 from .addRadsToSketch import entry as addRadsToSketch
 from .rotateCommand import entry as rotateCommand
+from .memoryReport import entry as memoryReport
+from .sketchSnapshot import entry as sketchSnapshot
 
 # TODO add your imported modules to this list.
 # Fusion will automatically call the start() and stop() functions.
 commands = [
     commandDialog,
     addRadsToSketch,
-    rotateCommand
+    rotateCommand,
+    memoryReport,
+    sketchSnapshot
 ]
 
 
@@ -1,7 +1,11 @@
 import adsk.core, traceback, math
 import adsk.fusion
 import os
+import fnmatch
+import json
 from ...lib import fusion360utils as futil
+from ...lib.fusion360utils import sketch_geometry as geometry
+from typing import NamedTuple
 from ... import config
 app = adsk.core.Application.get()
 ui = app.userInterface
@@ -26,163 +30,434 @@ COMMAND_BESIDE_ID = 'ScriptsManagerCommand'
 # Resource location for command icons, here we assume a sub folder in this directory named "resources".
 ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', '')
 
-# Local list of event handlers used to maintain a reference so
-# they are not released and garbage collected.
-local_handlers = []
+# The command definition, its button and the events of each command session.
+command = futil.FusionCommand(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER,
+                              workspace_id=WORKSPACE_ID, panel_id=PANEL_ID,
+                              command_beside_id=COMMAND_BESIDE_ID, is_promoted=IS_PROMOTED)
 
+# The attribute stored on every fillet arc the command adds, holding the corner it rounds.
+# Later runs use it to only touch the corners that changed.
+ATTRIBUTE_GROUP = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_addRadsToSketch'
+ATTRIBUTE_NAME = 'fillet'
 
-# Executed when add-in is run.
-def start():
-    # Create a command Definition.
-    cmd_def = ui.commandDefinitions.addButtonDefinition(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER)
-
-    # Define an event handler for the command created event. It will be called when the button is clicked.
-    futil.add_handler(cmd_def.commandCreated, command_created)
+# The sketches the command can target in the current command session, with the loops read from
+# them, see get_target_sketches and read_target_loops.
+_active_sketch = None
+_design_sketches = None
 
-    # ******** Add a button into the UI so the user can run the command. ********
-    # Get the target workspace the button will be created in.
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
+# The fillets planned for the current command session, see analyse_loops.
+_plans = None
 
-    # Get the panel the button will be created in.
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
 
-    # Create the button command control in the UI after the specified existing command.
-    control = panel.controls.addCommand(cmd_def, COMMAND_BESIDE_ID, False)
+# Executed when add-in is run.
+def start():
+    command.start()
 
-    # Specify if the command is promoted to the main toolbar. 
-    control.isPromoted = IS_PROMOTED
 
 # Executed when add-in is stopped.
 def stop():
-    # Get the various UI elements for this command
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-    command_control = panel.controls.itemById(CMD_ID)
-    command_definition = ui.commandDefinitions.itemById(CMD_ID)
-
-    # Delete the button command control
-    if command_control:
-        command_control.deleteMe()
-
-    # Delete the command definition
-    if command_definition:
-        command_definition.deleteMe()
+    command.stop()
 
 
 # Function that is called when a user clicks the corresponding button in the UI.
-# This defines the contents of the command dialog and connects to the command related events.
+# This defines the contents of the command dialog. The command related events are connected by the command.
+@command.on_created
 def command_created(args: adsk.core.CommandCreatedEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Created Event')
-
     # https://help.autodesk.com/view/fusion360/ENU/?contextId=CommandInputs
     inputs = args.command.commandInputs
 
     # TODO Define the dialog for your command by adding different inputs to the command.
+    inputs.addValueInput('radius', 'Radius', 'cm', adsk.core.ValueInput.createByReal(0.1))
+    inputs.addAngleValueCommandInput('min_angle', 'Minimum Turn Angle', adsk.core.ValueInput.createByReal(math.radians(1)))
+
+    # Fillets that don't fit between their neighbours are reduced to fit when checked, otherwise skipped.
+    inputs.addBoolValueInput('clamp_radii', 'Clamp Radii to Fit', True, '', True)
+
+    # Runs of nearly collinear lines, common in DXF imports, are replaced by single lines before filleting when checked.
+    inputs.addBoolValueInput('merge_collinear', 'Merge Collinear Lines', True, '', False)
+    merge_tolerance = inputs.addValueInput('merge_tolerance', 'Merge Tolerance', 'cm', adsk.core.ValueInput.createByReal(0.001))
+    merge_tolerance.tooltip = 'The furthest a removed point may be from the line that replaces it.'
+
+    # Design wide mode radiuses every sketch in every component that passes the filters.
+    inputs.addBoolValueInput('design_wide', 'All Sketches in Design', True, '', False)
+    include_filter = inputs.addStringValueInput('include_filter', 'Include', '')
+    include_filter.tooltip = 'Comma separated sketch name patterns, or attr:group.name for sketches with that attribute.'
+    exclude_filter = inputs.addStringValueInput('exclude_filter', 'Exclude', '')
+    exclude_filter.tooltip = include_filter.tooltip
 
     # Create a simple text box input.
-    tb = inputs.addTextBoxCommandInput('text_box', 'Some Text', 'Enter some text.', 1, False)
-    tb.text = ''
+    tb = inputs.addTextBoxCommandInput('text_box', 'Some Text', 'Enter some text.', 1, True)
     tb.isFullWidth = True
     tb.numRows = 50
 
-    # tb.text += app.activeProduct.productType + '\n'
-    if app.activeProduct.productType == "DesignProductType":
-        root = adsk.fusion.Design.cast(app.activeProduct)
-
-        # tb.text += '\n' + root.activeEditObject.objectType + '\n'
-        if root.activeEditObject.objectType == "adsk::fusion::Sketch":
-            sketch = adsk.fusion.Sketch.cast(root.activeEditObject)
-
-            profile = sketch.profiles.item(0) 
-            
-            # list datadfor all the contained curves in the profileloops
-            # build a collection of data to be used to add fillets between each curve based on the angle between them
-            # the first element will connect with the last element
-            # only add fillets between connected line3d's
-
-            try:
-                connections = []
-                curves = profile.profileLoops.item(0).profileCurves
-                for i in range(curves.count):
-                    first = curves.item(i)
-                    second = curves.item((i + 1) % curves.count)
-                    
-                    #line3d
-                    if first.geometry.objectType == "adsk::core::Line3D" and second.geometry.objectType == "adsk::core::Line3D":
-                        firstGeo = adsk.core.Line3D.cast(first.geometry)
-                        secondGeo = adsk.core.Line3D.cast(second.geometry)
-
-                        
-                        
-                        # add the needed data to collection: first element, first element end point, second element, second element start point
-                        connections.append([first.sketchEntity, firstGeo.endPoint, second.sketchEntity, secondGeo.startPoint])
-
-                for connection in connections:
-                    tb.text += f"{Point3dToString(connection[1])} -> {Point3dToString(connection[3])}\n"
-                    # type if sket entity
-                    firstLine = adsk.fusion.SketchLine.cast(connection[0])
-                    secondLine = adsk.fusion.SketchLine.cast(connection[2])
-
-                    #meause theanglebetween the lines
-
-                    angle = calculate_angle_between_lines(firstLine.geometry, secondLine.geometry)
-
-                    tb.text += f"{connection[0].objectType} -> {connection[2].objectType}\n"
-                    tb.text += f"{(angle / 3.14159*180):.4f}\n"
-
-                    # sketch.sketchCurves.sketchArcs.addFillet(connection[0], connection[1], connection[2], connection[3], 0.1)
-            except Exception as e:
-                ui.messageBox(f"Error: {e}")
-
-    # get the root components of the active design.
-    #     # tb.text = object_fields_to_string(root.rootComponent)
-
-    #     bb = adsk.core.BoundingBox3D.cast(root.rootComponent.boundingBox)
-    #     min = adsk.core.Point3D.cast(bb.minPoint)
-    #     max = adsk.core.Point3D.cast(bb.maxPoint)
-
-    #     tb.text = Point3dToString(scalePoint3d(addPoint3d(min, max), 0.5))
-
-    # TODO Connect to the events that are needed by this command.
-    futil.add_handler(args.command.execute, command_execute, local_handlers=local_handlers)
-    futil.add_handler(args.command.inputChanged, command_input_changed, local_handlers=local_handlers)
-    futil.add_handler(args.command.executePreview, command_preview, local_handlers=local_handlers)
-    futil.add_handler(args.command.validateInputs, command_validate_input, local_handlers=local_handlers)
-    futil.add_handler(args.command.destroy, command_destroy, local_handlers=local_handlers)
-
-
-def calculate_angle_between_lines(line1: adsk.core.Line3D, line2: adsk.core.Line3D) -> float:
+    update_summary(refresh=True)
+
+
+def parse_filter(text: str) -> list:
+    return [pattern.strip() for pattern in text.split(',') if pattern.strip()]
+
+
+def sketch_matches(sketch: adsk.fusion.Sketch, patterns: list) -> bool:
+    """Returns True if the sketch name matches any of the patterns.
+
+    Patterns starting with attr: match sketches that have an attribute with the given group.name.
+    """
+    for pattern in patterns:
+        if pattern.startswith('attr:'):
+            group, _, name = pattern[len('attr:'):].partition('.')
+            if sketch.attributes.itemByName(group, name):
+                return True
+        elif fnmatch.fnmatch(sketch.name, pattern):
+            return True
+    return False
+
+
+class TargetSketch:
+    """A sketch the command can target, with its loops once they have been read by read_target_loops."""
+
+    def __init__(self, sketch: adsk.fusion.Sketch):
+        self.sketch = sketch
+        self.loops = None
+
+
+def get_target_sketches() -> list:
+    """Returns the sketches to analyse, either the active sketch or the filtered sketches of every component.
+
+    The sketches are only looked up once per command session, so a change to the
+    filters just filters them again and keeps the loops already read from them.
+
+    :returns:
+        A list of TargetSketch objects.
     """
-    Calculates the angle between two lines.
-    
-    :param line1: The first line (adsk.core.Line3D).
-    :param line2: The second line (adsk.core.Line3D).
-    :return: The angle between the lines in radians (float).
+    global _active_sketch, _design_sketches
+    design = adsk.fusion.Design.cast(app.activeProduct)
+    if not design:
+        return []
+
+    if not command.inputs.bool_value('design_wide'):
+        if _active_sketch is None:
+            sketch = adsk.fusion.Sketch.cast(design.activeEditObject)
+            _active_sketch = [TargetSketch(sketch)] if sketch else []
+        return _active_sketch
+
+    if _design_sketches is None:
+        _design_sketches = []
+        components = design.allComponents
+        for i in range(components.count):
+            component_sketches = components.item(i).sketches
+            _design_sketches.extend(TargetSketch(component_sketches.item(j)) for j in range(component_sketches.count))
+
+    include = parse_filter(command.inputs.value('include_filter'))
+    exclude = parse_filter(command.inputs.value('exclude_filter'))
+
+    targets = []
+    for target in _design_sketches:
+        if include and not sketch_matches(target.sketch, include):
+            continue
+        if exclude and sketch_matches(target.sketch, exclude):
+            continue
+        targets.append(target)
+    return targets
+
+
+def read_fillet_tag(entity: adsk.fusion.SketchEntity) -> dict:
+    """Returns the corner id and parameters stored on a fillet arc this command added, or None for any other curve.
+
+    The tag is read from the curve itself. Entity tokens can't be used to match curves
+    to attributes found elsewhere, since Fusion can return different tokens for one entity.
     """
-    # Get the start and end points of each line to form vectors
-    start1 = line1.startPoint
-    end1 = line1.endPoint
-    vector1 = adsk.core.Vector3D.create(end1.x - start1.x, end1.y - start1.y, end1.z - start1.z)
+    attribute = entity.attributes.itemByName(ATTRIBUTE_GROUP, ATTRIBUTE_NAME)
+    if not attribute:
+        return None
+    try:
+        return json.loads(attribute.value)
+    except ValueError:
+        futil.log(f'{CMD_NAME} ignored a fillet with an unreadable tag: {attribute.value}')
+        return None
+
+
+def read_sketch_loops(sketch: adsk.fusion.Sketch) -> list:
+    """Reads the profile loops of a sketch into plain segments.
+
+    :returns:
+        A list of (segments, entities, fillets) tuples, one for each loop, where entities
+        holds the sketch entity of each segment and fillets holds a Fillet for each arc
+        in the loop that this command added.
+    """
+    loops = []
+    profiles = sketch.profiles
+    for i in range(profiles.count):
+        profile_loops = profiles.item(i).profileLoops
+        for j in range(profile_loops.count):
+            curves = profile_loops.item(j).profileCurves
+            segments = []
+            entities = []
+            fillets = []
+            for k in range(curves.count):
+                curve = curves.item(k)
+                entity = curve.sketchEntity
+                line = adsk.core.Line3D.cast(curve.geometry)
+                if line:
+                    start = line.startPoint
+                    end = line.endPoint
+                    segments.append(geometry.Segment(geometry.LINE, start.x, start.y, end.x, end.y))
+                else:
+                    _, start, end = curve.geometry.evaluator.getEndPoints()
+                    segments.append(geometry.Segment(geometry.CURVE, start.x, start.y, end.x, end.y))
+                    tag = read_fillet_tag(entity)
+                    if tag:
+                        fillets.append(geometry.Fillet(k, tag['key'], tag['radius']))
+                entities.append(entity)
+            loops.append((segments, entities, fillets))
+    return loops
+
+
+class LoopPlan(NamedTuple):
+    """The planned changes to one loop.
+
+    The corners are planned on the loop with the fillets this command added collapsed
+    back into sharp corners. kept holds the index into entities of each segment of that
+    loop, and the fillets refer to the arcs in entities by their segment index. segments
+    holds the Segment read for each entity.
+    """
+    segments: list
+    entities: list
+    kept: list
+    corners: list
+    adjustments: list
+    runs: list
+    added: list
+    updated: list
+    removed: list
+
+
+def read_target_loops(refresh: bool = False) -> list:
+    """Returns the loops of the target sketches as (sketch, segments, entities, fillets) tuples.
+
+    Reading the loops through the API is the expensive part of the analysis, so each
+    sketch is only read the first time it is a target in a command session, or again
+    when refresh is True after the sketches have been edited.
+    """
+    loops = []
+    for target in get_target_sketches():
+        if target.loops is None or refresh:
+            target.loops = read_sketch_loops(target.sketch)
+        loops.extend((target.sketch,) + loop for loop in target.loops)
+    return loops
+
+
+def analyse_loops(loops: list, radius: float, min_turn_angle: float, clamp: bool, merge_tolerance: float = 0) -> list:
+    """Plans the fillets for every loop returned by read_target_loops.
+
+    The planning is pure Python, so it runs on the main thread. A thread pool wouldn't
+    help since the GIL only lets one thread run it at a time.
+
+    :returns:
+        A list of (sketch, loops) tuples where loops is a list of LoopPlan tuples.
+        The corners of loops with runs refer to the merged loop, so the runs have to be
+        applied and the sketch analysed again before they can be filleted.
+    """
+    sketches = []
+    for sketch, segments, entities, fillets in loops:
+        if not sketches or sketches[-1][0] is not sketch:
+            sketches.append((sketch, []))
+        sketches[-1][1].append((segments, entities, fillets))
+
+    plans = []
+    for sketch, sketch_loops in sketches:
+        results = geometry.plan_sketch([(segments, fillets) for segments, _, fillets in sketch_loops],
+                                       radius, min_turn_angle, clamp, merge_tolerance)
+        plans.append((sketch, [LoopPlan(segments, entities, *result)
+                               for (segments, entities, _), result in zip(sketch_loops, results)]))
+    return plans
+
+
+def format_summary(plans: list) -> str:
+    lines = []
+    total = 0
+    for sketch, loops in plans:
+        added = [corner for loop in loops for corner in loop.added]
+        updated = [pair for loop in loops for pair in loop.updated]
+        removed = [fillet for loop in loops for fillet in loop.removed]
+        adjustments = [adjustment for loop in loops for adjustment in loop.adjustments]
+        runs = [run for loop in loops for run in loop.runs]
+        total += len(added) + len(updated) + len(removed)
+        line = (f'{sketch.parentComponent.name} / {sketch.name}: {len(added)} to add, {len(updated)} to update, '
+                f'{len(removed)} to remove, {len(adjustments)} adjusted')
+        if runs:
+            line += f', {sum(run.count for run in runs)} lines merge into {len(runs)}'
+        lines.append(line)
+
+        # Only list every corner when looking at a single sketch.
+        if len(plans) == 1:
+            for corner in added:
+                lines.append(f'  ({corner.x:.4f}, {corner.y:.4f}) {math.degrees(corner.turn_angle):.4f}')
+            for fillet, corner in updated:
+                lines.append(f'  ({corner.x:.4f}, {corner.y:.4f}) update: {fillet.radius:.4f} -> {corner.radius:.4f}')
+            for fillet in removed:
+                lines.append(f'  ({fillet.x:.4f}, {fillet.y:.4f}) remove')
+            for adjustment in adjustments:
+                lines.append(f'  ({adjustment.x:.4f}, {adjustment.y:.4f}) {adjustment.reason}: '
+                             f'{adjustment.requested:.4f} -> {adjustment.radius:.4f}')
+
+    lines.append(f'{total} changes in {len(plans)} sketches')
+    return '\n'.join(lines)
+
+
+def update_summary(merge: bool = True, refresh: bool = False):
+    """Analyses the target sketches and shows the result.
+
+    Arguments:
+    merge -- Whether to look for collinear runs, if Merge Collinear Lines is checked.
+    refresh -- Whether to read the loops from the sketches again rather than reuse the ones already read.
+    """
+    global _plans
+    inputs = command.inputs
+    loops = read_target_loops(refresh)
+    merge_tolerance = inputs.value('merge_tolerance') if merge and inputs.bool_value('merge_collinear') else 0
+    _plans = analyse_loops(loops, inputs.value('radius'), inputs.value('min_angle'), inputs.bool_value('clamp_radii'),
+                           merge_tolerance)
+    inputs.set_text('text_box', format_summary(_plans))
+
+
+def _end_sketch_point(line: adsk.fusion.SketchLine, x: float, y: float) -> adsk.fusion.SketchPoint:
+    """Returns the end point of a line closest to (x, y)."""
+    start = line.startSketchPoint
+    end = line.endSketchPoint
+    start_distance = (start.geometry.x - x) ** 2 + (start.geometry.y - y) ** 2
+    end_distance = (end.geometry.x - x) ** 2 + (end.geometry.y - y) ** 2
+    return start if start_distance <= end_distance else end
+
 
-    start2 = line2.startPoint
-    end2 = line2.endPoint
-    vector2 = adsk.core.Vector3D.create(end2.x - start2.x, end2.y - start2.y, end2.z - start2.z)
+def _joint_problem(first: adsk.fusion.SketchLine, second: adsk.fusion.SketchLine) -> str:
+    """Returns why the joint between two lines of a run can't be merged away, or None if it can."""
+    for point in (first.startSketchPoint, first.endSketchPoint):
+        if point == second.startSketchPoint or point == second.endSketchPoint:
+            return 'joint shared with other curves' if point.connectedEntities.count > 2 else None
+    # Common in DXF imports, where the ends are coincident but each line has its own point.
+    return 'end points not shared'
 
-    # Normalize the vectors
-    vector1.normalize()
-    vector2.normalize()
 
-    # Calculate the dot product
-    dotProduct = vector1.dotProduct(vector2)
+def _segment_key(segment: geometry.Segment) -> tuple:
+    """Returns a key that identifies a segment by its end points, whichever way round it runs."""
+    return tuple(sorted((geometry.corner_key(segment.x0, segment.y0), geometry.corner_key(segment.x1, segment.y1))))
 
-    # Ensure the dot product is within the valid range [-1, 1] to avoid numerical issues
-    dotProduct = max(min(dotProduct, 1.0), -1.0)
 
-    # Calculate the angle in radians
-    angleRadians = math.acos(dotProduct)
+def apply_merges(plans: list) -> tuple:
+    """Replaces each planned run of collinear lines with a single line, batching the writes to each sketch with compute deferred.
 
-    return angleRadians
+    Runs whose lines don't share their end points, whose inner points are shared with
+    other curves, or whose lines were already merged as part of a neighbouring profile,
+    are left alone.
+
+    :returns:
+        (merged, skipped) where merged is the number of runs that were merged and
+        skipped is a list of (sketch, run, reason) tuples for the runs that weren't.
+    """
+    count = 0
+    skipped = []
+    for sketch, loops in plans:
+        replaced = []
+        replaced_keys = set()
+        sketch.isComputeDeferred = True
+        try:
+            sketch_lines = sketch.sketchCurves.sketchLines
+            for loop in loops:
+                for run in loop.runs:
+                    indices = [(run.start + k) % len(loop.entities) for k in range(run.count)]
+                    keys = [_segment_key(loop.segments[i]) for i in indices]
+                    if any(key in replaced_keys for key in keys):
+                        # Neighbouring profiles share lines, so the other loop already merged this run.
+                        continue
+
+                    lines = [adsk.fusion.SketchLine.cast(loop.entities[i]) for i in indices]
+
+                    problems = [_joint_problem(first, second) for first, second in zip(lines, lines[1:])]
+                    problem = next((problem for problem in problems if problem), None)
+                    if problem:
+                        skipped.append((sketch, run, problem))
+                        continue
+
+                    # Connect the new line to the existing end points so it stays attached to its neighbours.
+                    start = _end_sketch_point(lines[0], run.x0, run.y0)
+                    end = _end_sketch_point(lines[-1], run.x1, run.y1)
+                    sketch_lines.addByTwoPoints(start, end)
+                    replaced.extend(lines)
+                    replaced_keys.update(keys)
+                    count += 1
+
+            # The old lines are only removed once every new line holds on to the shared end points.
+            for line in replaced:
+                line.deleteMe()
+        finally:
+            sketch.isComputeDeferred = False
+    return count, skipped
+
+
+def restore_corner(arc: adsk.fusion.SketchArc, first: adsk.fusion.SketchLine, second: adsk.fusion.SketchLine, x: float, y: float):
+    """Deletes a fillet arc and extends the lines it joined back to their corner at (x, y)."""
+    arc.deleteMe()
+    points = [_end_sketch_point(line, x, y) for line in (first, second)]
+    for point in points:
+        position = point.geometry
+        point.move(adsk.core.Vector3D.create(x - position.x, y - position.y, 0))
+    points[0].merge(points[1])
+
+
+def add_fillet(arcs: adsk.fusion.SketchArcs, first: adsk.fusion.SketchLine, second: adsk.fusion.SketchLine,
+               corner: geometry.Corner) -> adsk.fusion.SketchArc:
+    """Fillets a corner and tags the arc with the corner id and parameters, so later runs can find it."""
+    point = adsk.core.Point3D.create(corner.x, corner.y, 0)
+    arc = arcs.addFillet(first, point, second, point, corner.radius)
+    tag = {'key': geometry.corner_key(corner.x, corner.y), 'radius': corner.radius, 'turn_angle': corner.turn_angle}
+    arc.attributes.add(ATTRIBUTE_GROUP, ATTRIBUTE_NAME, json.dumps(tag))
+    return arc
+
+
+def apply_fillets(plans: list) -> tuple:
+    """Adds, updates and removes the planned fillets, batching the writes to each sketch with compute deferred.
+
+    Only the corners that changed since the last run are touched. Updated fillets are
+    removed and added again with their new radius.
+
+    :returns:
+        The number of fillets that were (added, updated, removed).
+    """
+    added = updated = removed = 0
+    for sketch, loops in plans:
+        sketch.isComputeDeferred = True
+        try:
+            arcs = sketch.sketchCurves.sketchArcs
+            for loop in loops:
+                lines = [loop.entities[i] for i in loop.kept]
+
+                def corner_lines(index: int) -> tuple:
+                    return lines[index], lines[(index + 1) % len(lines)]
+
+                for fillet in loop.removed:
+                    try:
+                        restore_corner(loop.entities[fillet.segment], *corner_lines(fillet.index), fillet.x, fillet.y)
+                        removed += 1
+                    except:
+                        futil.log(f'{CMD_NAME} failed to remove the fillet at ({fillet.x:.4f}, {fillet.y:.4f}) in {sketch.name}')
+
+                for fillet, corner in loop.updated:
+                    try:
+                        restore_corner(loop.entities[fillet.segment], *corner_lines(fillet.index), fillet.x, fillet.y)
+                        add_fillet(arcs, *corner_lines(corner.index), corner)
+                        updated += 1
+                    except:
+                        futil.log(f'{CMD_NAME} failed to update the fillet at ({corner.x:.4f}, {corner.y:.4f}) in {sketch.name}')
+
+                for corner in loop.added:
+                    try:
+                        add_fillet(arcs, *corner_lines(corner.index), corner)
+                        added += 1
+                    except:
+                        futil.log(f'{CMD_NAME} failed to add a fillet at ({corner.x:.4f}, {corner.y:.4f}) in {sketch.name}')
+        finally:
+            sketch.isComputeDeferred = False
+    return added, updated, removed
 
 def addPoint3d(p1: adsk.core.Point3D, p2: adsk.core.Point3D):
     return adsk.core.Point3D.create(p1.x + p2.x, p1.y + p2.y, p1.z + p2.z)
@@ -194,71 +469,50 @@ def Point3dToString(p: adsk.core.Point3D):
     #round to nearst 10000th
     return f"({p.x:.4f}, {p.y:.4f}, {p.z:.4f})"
 
-def object_fields_to_string(obj):
-    result = []
-    for attribute in dir(obj):
-        # Exclude magic methods and attributes
-        if not attribute.startswith('__'):
-            value = getattr(obj, attribute)
-            if value is None:
-                result.append(f"{attribute}: None")
-            else:
-                result.append(f"{attribute}: {value}")
-    return '\n'.join(result)
-
 # This event handler is called when the user clicks the OK button in the command dialog or 
 # is immediately called after the created event not command inputs were created for the dialog.
+@command.on_execute
 def command_execute(args: adsk.core.CommandEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Execute Event')
-
-    # TODO ******************************** Your code here ********************************
-
-    # Get a reference to your command's inputs.
-    inputs = args.command.commandInputs
+    if _plans is None:
+        update_summary()
 
-    # value_input: adsk.core.ValueCommandInput = inputs.itemById('value_input')
-    
+    if any(loop.runs for _, loops in _plans for loop in loops):
+        merged, skipped = apply_merges(_plans)
+        futil.log(f'{CMD_NAME} merged {merged} runs of collinear lines, skipped {len(skipped)}')
+        for sketch, run, reason in skipped:
+            futil.log(f'  {sketch.name}: {run.count} lines from ({run.x0:.4f}, {run.y0:.4f}) to ({run.x1:.4f}, {run.y1:.4f}) '
+                      f'not merged, {reason}')
 
-# This event handler is called when the command needs to compute a new preview in the graphics window.
-def command_preview(args: adsk.core.CommandEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Preview Event')
-    inputs = args.command.commandInputs
+        # The corners were planned on the merged loops, so plan them again on the lines the sketch has now.
+        update_summary(merge=False, refresh=True)
 
-    
+    added, updated, removed = apply_fillets(_plans)
+    futil.log(f'{CMD_NAME} added {added}, updated {updated} and removed {removed} fillets')
 
 
 # This event handler is called when the user changes anything in the command dialog
 # allowing you to modify values of other inputs based on that change.
+@command.on_input_changed
 def command_input_changed(args: adsk.core.InputChangedEventArgs):
-    changed_input = args.input
-    inputs = args.inputs
-
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Input Changed Event fired from a change to {changed_input.id}')
+    # The loops of each sketch are read once per session, so changing the targets or the
+    # parameters only reads the sketches that haven't been targeted yet and plans again.
+    if args.input.id in ('design_wide', 'include_filter', 'exclude_filter', 'radius', 'min_angle',
+                         'clamp_radii', 'merge_collinear', 'merge_tolerance'):
+        update_summary()
 
 
 # This event handler is called when the user interacts with any of the inputs in the dialog
 # which allows you to verify that all of the inputs are valid and enables the OK button.
+@command.on_validate_inputs
 def command_validate_input(args: adsk.core.ValidateInputsEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Validate Input Event')
-
-    inputs = args.inputs
-    
     # Verify the validity of the input values. This controls if the OK button is enabled or not.
-    valueInput = inputs.itemById('value_input')
-    if valueInput.value >= 0:
-        args.areInputsValid = True
-    else:
-        args.areInputsValid = False
-        
+    args.areInputsValid = command.inputs.value('radius') > 0 and command.inputs.value('merge_tolerance') >= 0
+
 
 # This event handler is called when the command terminates.
+@command.on_destroy
 def command_destroy(args: adsk.core.CommandEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Destroy Event')
-
-    global local_handlers
-    local_handlers = []
+    global _active_sketch, _design_sketches, _plans
+    _active_sketch = None
+    _design_sketches = None
+    _plans = None
@@ -0,0 +1,112 @@
+import time
+from typing import Callable
+
+import adsk.core, adsk.fusion
+
+
+class _CallCounter:
+    """Wraps a Fusion API object and counts the calls into the API made through it.
+
+    Property reads that return API objects, method calls and property writes are
+    each counted as one call. Anything returned from the API is wrapped as well,
+    so calls made on the returned entities are counted too.
+    """
+    def __init__(self, target, counts: dict):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_counts', counts)
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if callable(value):
+            return _CallCounter(value, self._counts)
+        if _is_api_object(value):
+            self._counts['api_calls'] += 1
+            return _CallCounter(value, self._counts)
+        return value
+
+    def __setattr__(self, name, value):
+        self._counts['api_calls'] += 1
+        setattr(self._target, name, _unwrap(value))
+
+    def __call__(self, *args, **kwargs):
+        self._counts['api_calls'] += 1
+        result = self._target(*[_unwrap(arg) for arg in args], **{k: _unwrap(v) for k, v in kwargs.items()})
+        return _CallCounter(result, self._counts) if _is_api_object(result) else result
+
+
+def _unwrap(value):
+    return object.__getattribute__(value, '_target') if isinstance(value, _CallCounter) else value
+
+
+def _is_api_object(value) -> bool:
+    return type(value).__module__.startswith('adsk.')
+
+
+def _count_entities(sketch: adsk.fusion.Sketch) -> int:
+    return sketch.sketchCurves.count + sketch.sketchPoints.count
+
+
+def _count_constraints(sketch: adsk.fusion.Sketch) -> int:
+    return sketch.geometricConstraints.count + sketch.sketchDimensions.count
+
+
+def benchmark_rectangle_mode(design: adsk.fusion.Design, make_rectangle: Callable, mode: str, count: int) -> dict:
+    """Stamps rectangles around points in a temporary sketch and measures what they cost.
+
+    Arguments:
+    design -- The design to create the temporary sketch in. The sketch is deleted afterwards.
+    make_rectangle -- The function that creates the rectangle, called as make_rectangle(sketch, w, h, point, mode).
+    mode -- The constraint mode to pass to make_rectangle.
+    count -- The number of rectangles to stamp.
+
+    :returns:
+        A dictionary with the entity, constraint and API call counts per shape and the total time.
+    """
+    root = design.rootComponent
+    sketch = root.sketches.add(root.xYConstructionPlane)
+    try:
+        points = [sketch.sketchPoints.add(adsk.core.Point3D.create(i * 5, 0, 0)) for i in range(count)]
+        entities = _count_entities(sketch)
+        constraints = _count_constraints(sketch)
+
+        counts = {'api_calls': 0}
+        counted_sketch = _CallCounter(sketch, counts)
+
+        start = time.perf_counter()
+        for point in points:
+            make_rectangle(counted_sketch, 1.0, 1.0, point, mode)
+        elapsed = time.perf_counter() - start
+
+        return {
+            'mode': mode,
+            'count': count,
+            'entities': (_count_entities(sketch) - entities) / count,
+            'constraints': (_count_constraints(sketch) - constraints) / count,
+            'api_calls': counts['api_calls'] / count,
+            'seconds': elapsed,
+        }
+    finally:
+        sketch.deleteMe()
+
+
+def compare_rectangle_modes(design: adsk.fusion.Design, make_rectangle: Callable, modes: list, count: int = 50) -> list:
+    """Runs benchmark_rectangle_mode for each mode and returns the list of results."""
+    return [benchmark_rectangle_mode(design, make_rectangle, mode, count) for mode in modes]
+
+
+def format_results(results: list) -> str:
+    """Formats the results, with the difference of each mode from the first one."""
+    lines = []
+    for result in results:
+        lines.append(f'{result["mode"]} ({result["count"]} shapes): '
+                     f'{result["entities"]:.1f} entities, {result["constraints"]:.1f} constraints, '
+                     f'{result["api_calls"]:.1f} API calls per shape, {result["seconds"]:.3f}s')
+
+    base = results[0]
+    for result in results[1:]:
+        lines.append(f'{result["mode"]} vs {base["mode"]}: '
+                     f'{result["entities"] - base["entities"]:+.1f} entities, '
+                     f'{result["constraints"] - base["constraints"]:+.1f} constraints, '
+                     f'{result["api_calls"] - base["api_calls"]:+.1f} API calls per shape, '
+                     f'{(result["seconds"] / base["seconds"] - 1) * 100 if base["seconds"] else 0:+.0f}% time')
+    return '\n'.join(lines)
@@ -2,6 +2,7 @@ import adsk.core, adsk.fusion
 import os
 from ...lib import fusion360utils as futil
 from ... import config
+from . import benchmark
 app = adsk.core.Application.get()
 ui = app.userInterface
 
@@ -25,56 +26,30 @@ COMMAND_BESIDE_ID = 'ScriptsManagerCommand'
 # Resource location for command icons, here we assume a sub folder in this directory named "resources".
 ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', '')
 
-# Local list of event handlers used to maintain a reference so
-# they are not released and garbage collected.
-local_handlers = []
+# The command definition, its button and the events of each command session.
+command = futil.FusionCommand(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER,
+                              workspace_id=WORKSPACE_ID, panel_id=PANEL_ID,
+                              command_beside_id=COMMAND_BESIDE_ID, is_promoted=IS_PROMOTED)
+
+# The ways a rectangle can be constrained, see make_rectangle_geometry.
+RECTANGLE_MODE_STANDARD = 'Standard'
+RECTANGLE_MODE_LIGHTWEIGHT = 'Lightweight'
 
 
 # Executed when add-in is run.
 def start():
-    # Create a command Definition.
-    cmd_def = ui.commandDefinitions.addButtonDefinition(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER)
-
-    # Define an event handler for the command created event. It will be called when the button is clicked.
-    futil.add_handler(cmd_def.commandCreated, command_created)
-
-    # ******** Add a button into the UI so the user can run the command. ********
-    # Get the target workspace the button will be created in.
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-
-    # Get the panel the button will be created in.
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-
-    # Create the button command control in the UI after the specified existing command.
-    control = panel.controls.addCommand(cmd_def, COMMAND_BESIDE_ID, False)
-
-    # Specify if the command is promoted to the main toolbar. 
-    control.isPromoted = IS_PROMOTED
+    command.start()
 
 
 # Executed when add-in is stopped.
 def stop():
-    # Get the various UI elements for this command
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-    command_control = panel.controls.itemById(CMD_ID)
-    command_definition = ui.commandDefinitions.itemById(CMD_ID)
-
-    # Delete the button command control
-    if command_control:
-        command_control.deleteMe()
-
-    # Delete the command definition
-    if command_definition:
-        command_definition.deleteMe()
+    command.stop()
 
 
 # Function that is called when a user clicks the corresponding button in the UI.
-# This defines the contents of the command dialog and connects to the command related events.
+# This defines the contents of the command dialog. The command related events are connected by the command.
+@command.on_created
 def command_created(args: adsk.core.CommandCreatedEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Created Event')
-
     # https://help.autodesk.com/view/fusion360/ENU/?contextId=CommandInputs
     inputs = args.command.commandInputs
 
@@ -98,37 +73,28 @@ def command_created(args: adsk.core.CommandCreatedEventArgs):
     rectangleGroupInputs = rectangleGroup.children
     rectangleGroupInputs.addValueInput('rectangleWidth', 'Width', 'cm', adsk.core.ValueInput.createByReal(1.0))
     rectangleGroupInputs.addValueInput('rectangleHeight', 'Height', 'cm', adsk.core.ValueInput.createByReal(1.0))
+
+    # Lightweight mode builds the same fully defined rectangle with one sketch point and one constraint fewer.
+    rectangleModeDropDown = rectangleGroupInputs.addDropDownCommandInput('rectangleMode', 'Constraints', adsk.core.DropDownStyles.TextListDropDownStyle)
+    rectangleModeDropDown.listItems.add(RECTANGLE_MODE_STANDARD, True)
+    rectangleModeDropDown.listItems.add(RECTANGLE_MODE_LIGHTWEIGHT, False)
+
+    # Compares the two modes in a temporary sketch instead of creating any geometry.
+    rectangleGroupInputs.addBoolValueInput('runBenchmark', 'Run Benchmark', True, '', False)
         
     # Initially, show only the inputs for the Circle (default selection)
     circleGroup.isVisible = True
     rectangleGroup.isVisible = False
 
-    # TODO Connect to the events that are needed by this command.
-    futil.add_handler(args.command.execute, command_execute, local_handlers=local_handlers)
-    futil.add_handler(args.command.inputChanged, command_input_changed, local_handlers=local_handlers)
-    futil.add_handler(args.command.executePreview, command_preview, local_handlers=local_handlers)
-    futil.add_handler(args.command.validateInputs, command_validate_input, local_handlers=local_handlers)
-    futil.add_handler(args.command.destroy, command_destroy, local_handlers=local_handlers)
-
-# renders all objects values to a string
-def objectdata_to_string(obj):
-    data = ''
-    for attr in dir(obj):
-        if not attr.startswith('__') and not callable(getattr(obj, attr)):
-            #if it's a Vector3d or Point3d, print the x,y,z values else just render the default string
-            attribute = getattr(obj, attr)
-            if attribute.__class__.__name__ == 'Vector3D' or attribute.__class__.__name__ == 'Point3D':
-                data += f'{attr}: {getattr(obj, attr).x}, {getattr(obj, attr).y}, {getattr(obj, attr).z}\n'
-            else:
-                data += f'{attr}: {getattr(obj, attr)}\n'
-    return data
-
 # This event handler is called when the user clicks the OK button in the command dialog or 
 # is immediately called after the created event not command inputs were created for the dialog.
+@command.on_execute
 def command_execute(args: adsk.core.CommandEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Execute Event')
-    inputs = args.command.commandInputs
+    if command.inputs.bool_value('runBenchmark'):
+        design = adsk.fusion.Design.cast(app.activeProduct)
+        results = benchmark.compare_rectangle_modes(design, make_rectangle_geometry, [RECTANGLE_MODE_STANDARD, RECTANGLE_MODE_LIGHTWEIGHT])
+        ui.messageBox(benchmark.format_results(results))
+        return
 
     try:
         editObject = app.activeEditObject
@@ -136,12 +102,7 @@ def command_execute(args: adsk.core.CommandEventArgs):
         if editObject.classType() == 'adsk::fusion::Sketch':
             sketch = adsk.fusion.Sketch.cast(editObject)
 
-            pointSelections = adsk.core.SelectionCommandInput.cast(inputs.itemById('point_selection'))
-
-            points = []
-            for i in range(pointSelections.selectionCount):
-                point = adsk.fusion.SketchPoint.cast(pointSelections.selection(i).entity)
-                points.append(point)
+            points = [adsk.fusion.SketchPoint.cast(entity) for entity in command.inputs.selections('point_selection')]
 
             # for point in points:
                 # make_geometry(sketch, width, height, point)
@@ -154,43 +115,42 @@ def command_execute(args: adsk.core.CommandEventArgs):
 
 
 # This event handler is called when the command needs to compute a new preview in the graphics window.
+@command.on_preview
 def command_preview(args: adsk.core.CommandEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Preview Event')
-    inputs = args.command.commandInputs
+    inputs = command.inputs
     try:
-        pointSelections = adsk.core.SelectionCommandInput.cast(inputs.itemById('point_selection'))
         editObject = app.activeEditObject
         if editObject.classType() == 'adsk::fusion::Sketch':
             sketch = adsk.fusion.Sketch.cast(editObject)
 
-            shapeDropDown = adsk.core.DropDownCommandInput.cast(inputs.itemById('shapeDropDown'))
-            selectedShape = shapeDropDown.selectedItem.name
-            for i in range(pointSelections.selectionCount):
-                point = adsk.fusion.SketchPoint.cast(pointSelections.selection(i).entity)
-                if selectedShape == 'Circle':
-                    circleGroup = adsk.core.GroupCommandInput.cast(inputs.itemById('circleGroup'))
-                    radius = circleGroup.children.itemById('circleRadius').value
-                    make_circle_geometry(sketch, radius, point)
-                elif selectedShape == 'Rectangle':
-                    rectangleGroup = adsk.core.GroupCommandInput.cast(inputs.itemById('rectangleGroup'))
-                    width = rectangleGroup.children.itemById('rectangleWidth').value
-                    height = rectangleGroup.children.itemById('rectangleHeight').value
-                    make_rectangle_geometry(sketch, width, height, point)
-                # elif selectedShape == 'Triangle':
-                #     triangleGroup = adsk.core.GroupCommandInput.cast(inputs.itemById('triangleGroup'))
-                #     base = triangleGroup.children.itemById('triangleBase').value
-                #     height = triangleGroup.children.itemById('triangleHeight').value
-                #     make_triangle_geometry(sketch, base, height, point)
+            selectedShape = inputs.selected_name('shapeDropDown')
+
+            # Defer the solve until every shape has been added.
+            sketch.isComputeDeferred = True
+            try:
+                for entity in inputs.selections('point_selection'):
+                    point = adsk.fusion.SketchPoint.cast(entity)
+                    if selectedShape == 'Circle':
+                        make_circle_geometry(sketch, inputs.value('circleRadius'), point)
+                    elif selectedShape == 'Rectangle':
+                        width = inputs.value('rectangleWidth')
+                        height = inputs.value('rectangleHeight')
+                        make_rectangle_geometry(sketch, width, height, point, inputs.selected_name('rectangleMode'))
+                    # elif selectedShape == 'Triangle':
+                    #     base = inputs.value('triangleBase')
+                    #     height = inputs.value('triangleHeight')
+                    #     make_triangle_geometry(sketch, base, height, point)
+            finally:
+                sketch.isComputeDeferred = False
 
     except Exception as e:
         ui.messageBox(f'Failed:\n{e}')
 
 #creates a center point rectangle with the given width and height
-def make_rectangle_geometry(sketch: adsk.fusion.Sketch, w, h, c: adsk.fusion.SketchPoint):
-    lineList = sketch.sketchCurves.sketchLines.addCenterPointRectangle(adsk.core.Point3D.create(0, 0, 0), adsk.core.Point3D.create(w, h, 0))
-    sketch.sketchDimensions.addDistanceDimension(lineList.item(0).startSketchPoint, lineList.item(0).endSketchPoint, adsk.fusion.DimensionOrientations.HorizontalDimensionOrientation, adsk.core.Point3D.create(0, h + .5, 0))
-    sketch.sketchDimensions.addDistanceDimension(lineList.item(1).startSketchPoint, lineList.item(1).endSketchPoint, adsk.fusion.DimensionOrientations.VerticalDimensionOrientation, adsk.core.Point3D.create(-w - .5, 0, 0))
+def make_rectangle_geometry(sketch: adsk.fusion.Sketch, w, h, c: adsk.fusion.SketchPoint, mode: str = RECTANGLE_MODE_STANDARD):
+    lineList = sketch.sketchCurves.sketchLines.addCenterPointRectangle(adsk.core.Point3D.create(0, 0, 0), adsk.core.Point3D.create(w / 2, h / 2, 0))
+    sketch.sketchDimensions.addDistanceDimension(lineList.item(0).startSketchPoint, lineList.item(0).endSketchPoint, adsk.fusion.DimensionOrientations.HorizontalDimensionOrientation, adsk.core.Point3D.create(0, h / 2 + .5, 0))
+    sketch.sketchDimensions.addDistanceDimension(lineList.item(1).startSketchPoint, lineList.item(1).endSketchPoint, adsk.fusion.DimensionOrientations.VerticalDimensionOrientation, adsk.core.Point3D.create(-w / 2 - .5, 0, 0))
 
     # add horizontal and vertical constraints
     sketch.geometricConstraints.addHorizontal(lineList.item(0))
@@ -203,6 +163,11 @@ def make_rectangle_geometry(sketch: adsk.fusion.Sketch, w, h, c: adsk.fusion.Ske
         lineList.item(0).startSketchPoint, lineList.item(2).startSketchPoint)
     line.isConstruction = True
 
+    if mode == RECTANGLE_MODE_LIGHTWEIGHT:
+        # constrain the selected point to the middle of the diagonal line directly
+        sketch.geometricConstraints.addMidPoint(c, line)
+        return
+
     # add a point and constrain it to the middle of the diagonal line
     midPoint = sketch.sketchPoints.add(adsk.core.Point3D.create(0, 0, 0))
     sketch.geometricConstraints.addMidPoint(midPoint, line)
@@ -220,42 +185,21 @@ def make_circle_geometry(sketch: adsk.fusion.Sketch, r, c: adsk.fusion.SketchPoi
 
 # This event handler is called when the user changes anything in the command dialog
 # allowing you to modify values of other inputs based on that change.
+@command.on_input_changed
 def command_input_changed(args: adsk.core.InputChangedEventArgs):
-    # changed_input = args.input
-    inputs = args.inputs
-
-    selectedShape = adsk.core.DropDownCommandInput.cast(args.input)
-
-    if selectedShape.id == 'shapeDropDown':
-        selectedShape = selectedShape.selectedItem.name
-        inputs.itemById('circleGroup').isVisible = (selectedShape == 'Circle')
-        inputs.itemById('rectangleGroup').isVisible = (selectedShape == 'Rectangle')
-        inputs.itemById('triangleGroup').isVisible = (selectedShape == 'Triangle')
-
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Input Changed Event fired from a change to {selectedShape.id}')
+    if args.input.id == 'shapeDropDown':
+        selectedShape = command.inputs.selected_name('shapeDropDown')
+        command.inputs['circleGroup'].isVisible = (selectedShape == 'Circle')
+        command.inputs['rectangleGroup'].isVisible = (selectedShape == 'Rectangle')
 
 
 # This event handler is called when the user interacts with any of the inputs in the dialog
 # which allows you to verify that all of the inputs are valid and enables the OK button.
+@command.on_validate_inputs
 def command_validate_input(args: adsk.core.ValidateInputsEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Validate Input Event')
+    inputs = command.inputs
 
-    inputs = args.inputs
-    
     # Verify the validity of the input values. This controls if the OK button is enabled or not.
-    valueInput = inputs.itemById('value_input')
-    if valueInput.value >= 0:
-        args.areInputsValid = True
-    else:
-        args.areInputsValid = False
-        
-
-# This event handler is called when the command terminates.
-def command_destroy(args: adsk.core.CommandEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Destroy Event')
-
-    global local_handlers
-    local_handlers = []
+    args.areInputsValid = (inputs.value('circleRadius') > 0 and
+                           inputs.value('rectangleWidth') > 0 and
+                           inputs.value('rectangleHeight') > 0)
@@ -0,0 +1,57 @@
+import adsk.core
+import os
+from ...lib import fusion360utils as futil
+from ... import config
+app = adsk.core.Application.get()
+ui = app.userInterface
+
+
+CMD_ID = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_memoryReport'
+CMD_NAME = 'Memory Report'
+CMD_Description = 'Show the top memory allocators and live Fusion objects since the add-in started'
+
+# Specify that the command will be promoted to the panel.
+IS_PROMOTED = False
+
+# This is done by specifying the workspace, the tab, and the panel, and the 
+# command it will be inserted beside. Not providing the command to position it
+# will insert it at the end.
+WORKSPACE_ID = 'FusionSolidEnvironment'
+PANEL_ID = 'SolidScriptsAddinsPanel'
+COMMAND_BESIDE_ID = 'ScriptsManagerCommand'
+
+# Resource location for command icons, here we assume a sub folder in this directory named "resources".
+ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', '')
+
+# The command definition, its button and the events of each command session.
+command = futil.FusionCommand(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER,
+                              workspace_id=WORKSPACE_ID, panel_id=PANEL_ID,
+                              command_beside_id=COMMAND_BESIDE_ID, is_promoted=IS_PROMOTED)
+
+
+# Executed when add-in is run.
+def start():
+    command.start()
+
+
+# Executed when add-in is stopped.
+def stop():
+    command.stop()
+
+
+# Function that is called when a user clicks the corresponding button in the UI.
+# This defines the contents of the command dialog. The command related events are connected by the command.
+@command.on_created
+def command_created(args: adsk.core.CommandCreatedEventArgs):
+    inputs = args.command.commandInputs
+
+    # The report is also written to the Text Command window so it can be copied out.
+    report = futil.memory_report()
+    futil.log(report, force_console=True)
+
+    tb = inputs.addTextBoxCommandInput('text_box', 'Report', report, 40, True)
+    tb.isFullWidth = True
+
+    # There is nothing to execute, so only show the close button.
+    args.command.isOKButtonVisible = False
+    args.command.cancelButtonText = 'Close'
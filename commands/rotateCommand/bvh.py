@@ -0,0 +1,133 @@
+from typing import NamedTuple
+
+# A bounding-volume hierarchy over axis aligned boxes, used to screen rotated
+# occurrences for interference before running an exact check. It only works on
+# plain tuples so it doesn't need Fusion to run.
+#
+# Boxes are (min x, min y, min z, max x, max y, max z) tuples.
+
+# The most boxes kept in one leaf before it is split.
+LEAF_SIZE = 4
+
+
+class Node(NamedTuple):
+    """A node of the hierarchy. Leaves have no children and list the indices of their boxes."""
+    box: tuple
+    left: int
+    right: int
+    items: tuple
+
+
+def transform_box(box: tuple, matrix: list) -> tuple:
+    """Returns the axis aligned box around a box after it is transformed.
+
+    Arguments:
+    box -- The box to transform.
+    matrix -- A 4x4 transform as 16 numbers in row major order, as returned by Matrix3D.asArray.
+    """
+    # Each axis of the result is the translation plus the smaller or larger of each
+    # rotated extent, which avoids transforming all eight corners.
+    low = [matrix[3], matrix[7], matrix[11]]
+    high = list(low)
+    for row in range(3):
+        for column in range(3):
+            a = matrix[row * 4 + column] * box[column]
+            b = matrix[row * 4 + column] * box[column + 3]
+            low[row] += min(a, b)
+            high[row] += max(a, b)
+    return (low[0], low[1], low[2], high[0], high[1], high[2])
+
+
+def overlaps(a: tuple, b: tuple, tolerance: float = 0.0) -> bool:
+    return (a[0] <= b[3] + tolerance and b[0] <= a[3] + tolerance and
+            a[1] <= b[4] + tolerance and b[1] <= a[4] + tolerance and
+            a[2] <= b[5] + tolerance and b[2] <= a[5] + tolerance)
+
+
+def _union(boxes: list, items: list) -> tuple:
+    return (min(boxes[i][0] for i in items), min(boxes[i][1] for i in items), min(boxes[i][2] for i in items),
+            max(boxes[i][3] for i in items), max(boxes[i][4] for i in items), max(boxes[i][5] for i in items))
+
+
+def build_bvh(boxes: list) -> list:
+    """Builds a hierarchy over a list of boxes.
+
+    Each node is split at the median of the box centres along the axis where the
+    centres are most spread out, so the tree is balanced and takes O(n log n) to build.
+
+    :returns:
+        A list of Node tuples with the root first, or an empty list if there are no boxes.
+    """
+    if not boxes:
+        return []
+
+    centres = [((box[0] + box[3]) / 2, (box[1] + box[4]) / 2, (box[2] + box[5]) / 2) for box in boxes]
+    nodes = [None]
+
+    # An explicit stack of (node index, box indices) so deep trees don't hit the recursion limit.
+    stack = [(0, list(range(len(boxes))))]
+    while stack:
+        index, items = stack.pop()
+        box = _union(boxes, items)
+        if len(items) <= LEAF_SIZE:
+            nodes[index] = Node(box, -1, -1, tuple(items))
+            continue
+
+        axis = max(range(3), key=lambda a: max(centres[i][a] for i in items) - min(centres[i][a] for i in items))
+        items.sort(key=lambda i: centres[i][axis])
+        middle = len(items) // 2
+
+        left = len(nodes)
+        nodes.extend((None, None))
+        nodes[index] = Node(box, left, left + 1, ())
+        stack.append((left, items[:middle]))
+        stack.append((left + 1, items[middle:]))
+
+    return nodes
+
+
+def query(nodes: list, boxes: list, box: tuple, tolerance: float = 0.0) -> list:
+    """Returns the indices of the boxes in the hierarchy that overlap a box.
+
+    Arguments:
+    nodes -- The hierarchy returned by build_bvh.
+    boxes -- The boxes the hierarchy was built from.
+    box -- The box to look for overlaps with.
+    tolerance -- Boxes closer than this count as overlapping.
+    """
+    found = []
+    if not nodes:
+        return found
+
+    stack = [0]
+    while stack:
+        node = nodes[stack.pop()]
+        if not overlaps(node.box, box, tolerance):
+            continue
+        if node.left < 0:
+            found.extend(i for i in node.items if overlaps(box, boxes[i], tolerance))
+        else:
+            stack.append(node.left)
+            stack.append(node.right)
+    return found
+
+
+def find_candidate_pairs(moved: list, others: list, tolerance: float = 0.0) -> list:
+    """Finds the pairs of boxes that may collide between a moved set and everything else.
+
+    A hierarchy is built over the other boxes and queried with each moved box, so this
+    takes O((n + m) log n) rather than comparing every pair.
+
+    Arguments:
+    moved -- The boxes of the moved items.
+    others -- The boxes of the items that stayed where they were.
+    tolerance -- Boxes closer than this count as overlapping.
+
+    :returns:
+        A list of (moved index, other index) tuples.
+    """
+    nodes = build_bvh(others)
+    pairs = []
+    for i, box in enumerate(moved):
+        pairs.extend((i, j) for j in query(nodes, others, box, tolerance))
+    return pairs
@@ -3,6 +3,7 @@ import adsk.fusion
 import os
 from ...lib import fusion360utils as futil
 from ... import config
+from . import bvh
 app = adsk.core.Application.get()
 ui = app.userInterface
 
@@ -26,55 +27,47 @@ COMMAND_BESIDE_ID = 'ScriptsManagerCommand'
 # Resource location for command icons, here we assume a sub folder in this directory named "resources".
 ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', '')
 
-# Local list of event handlers used to maintain a reference so
-# they are not released and garbage collected.
-local_handlers = []
+# The command definition, its button and the events of each command session.
+command = futil.FusionCommand(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER,
+                              workspace_id=WORKSPACE_ID, panel_id=PANEL_ID,
+                              command_beside_id=COMMAND_BESIDE_ID, is_promoted=IS_PROMOTED)
 
+# Index from component id to every occurrence of that component in the active
+# design. It is built once per command session from rootComponent.allOccurrences
+# and cleared when the command is destroyed, so later sessions see design changes.
+_occurrence_index = None
 
-# Executed when add-in is run.
-def start():
-    # Create a command Definition.
-    cmd_def = ui.commandDefinitions.addButtonDefinition(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER)
+# The bounding box of each component in its own space as a plain tuple, and its corners
+# as CustomGraphicsCoordinates, keyed by component id. Fast previews draw these boxes
+# instead of moving the occurrences, so a preview costs the same for a simple part as for
+# a detailed one, and the interference check transforms them for each occurrence.
+_component_boxes = {}
+_proxy_coordinates = {}
 
-    # Define an event handler for the command created event. It will be called when the button is clicked.
-    futil.add_handler(cmd_def.commandCreated, command_created)
+# The custom graphics group the current fast preview is drawn in.
+_preview_graphics = None
 
-    # ******** Add a button into the UI so the user can run the command. ********
-    # Get the target workspace the button will be created in.
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
+# Pairs of bounding box corner indices that make up the twelve edges of a box. Corner i
+# takes its x, y and z from the max point where bits 0, 1 and 2 of i are set.
+BOX_EDGES = [0, 1, 2, 3, 4, 5, 6, 7,
+             0, 2, 1, 3, 4, 6, 5, 7,
+             0, 4, 1, 5, 2, 6, 3, 7]
 
-    # Get the panel the button will be created in.
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
 
-    # Create the button command control in the UI after the specified existing command.
-    control = panel.controls.addCommand(cmd_def, COMMAND_BESIDE_ID, False)
+# Executed when add-in is run.
+def start():
+    command.start()
 
-    # Specify if the command is promoted to the main toolbar. 
-    control.isPromoted = IS_PROMOTED
 
 # Executed when add-in is stopped.
 def stop():
-    # Get the various UI elements for this command
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-    command_control = panel.controls.itemById(CMD_ID)
-    command_definition = ui.commandDefinitions.itemById(CMD_ID)
-
-    # Delete the button command control
-    if command_control:
-        command_control.deleteMe()
-
-    # Delete the command definition
-    if command_definition:
-        command_definition.deleteMe()
+    command.stop()
 
 
 # Function that is called when a user clicks the corresponding button in the UI.
-# This defines the contents of the command dialog and connects to the command related events.
+# This defines the contents of the command dialog. The command related events are connected by the command.
+@command.on_created
 def command_created(args: adsk.core.CommandCreatedEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Created Event')
-
     # https://help.autodesk.com/view/fusion360/ENU/?contextId=CommandInputs
     inputs = args.command.commandInputs
 
@@ -85,12 +78,168 @@ def command_created(args: adsk.core.CommandCreatedEventArgs):
     angle = inputs.addAngleValueCommandInput('angle', 'Angle', adsk.core.ValueInput.createByReal(0))
     angle.setManipulator( adsk.core.Point3D.create(50, 0, 0), adsk.core.Vector3D.create(1,0,0), adsk.core.Vector3D.create(0,1,0))
 
-    # TODO Connect to the events that are needed by this command.
-    futil.add_handler(args.command.execute, command_execute, local_handlers=local_handlers)
-    futil.add_handler(args.command.inputChanged, command_input_changed, local_handlers=local_handlers)
-    futil.add_handler(args.command.executePreview, command_preview, local_handlers=local_handlers)
-    futil.add_handler(args.command.validateInputs, command_validate_input, local_handlers=local_handlers)
-    futil.add_handler(args.command.destroy, command_destroy, local_handlers=local_handlers)
+    # When checked, selecting a component or one of its occurrences rotates every occurrence of that component.
+    inputs.addBoolValueInput('all_occurrences', 'All Occurrences', True, '', False)
+
+    # When checked, the preview draws the bounding box of each occurrence instead of moving it.
+    # The occurrences are only moved when the command is executed.
+    inputs.addBoolValueInput('fast_preview', 'Fast Preview', True, '', True)
+
+    # When checked, the rotated occurrences are screened against the rest of the assembly after
+    # they are moved and the pairs whose bounding boxes overlap are selected for an exact check.
+    check = inputs.addBoolValueInput('check_interference', 'Check Interference', True, '', False)
+    check.tooltip = 'Selects the occurrences whose bounding boxes overlap after the rotation.'
+
+def get_occurrence_index(design: adsk.fusion.Design) -> dict:
+    """Returns a dictionary mapping each component id to all of its occurrences in the design.
+
+    The index is only built the first time it is needed in a command session.
+    """
+    global _occurrence_index
+    if _occurrence_index is None:
+        _occurrence_index = {}
+        occurrences = design.rootComponent.allOccurrences
+        for i in range(occurrences.count):
+            occ = occurrences.item(i)
+            _occurrence_index.setdefault(occ.component.id, []).append(occ)
+    return _occurrence_index
+
+
+def clear_occurrence_index():
+    global _occurrence_index
+    _occurrence_index = None
+
+
+def get_selected_occurrences(design: adsk.fusion.Design, all_occurrences: bool) -> list:
+    """Returns the occurrences to rotate based on the active selection.
+
+    Selected occurrences are used directly. If all_occurrences is True, every occurrence
+    of each selected occurrence's component is returned instead, and selected components
+    are expanded to their occurrences as well.
+    """
+    occurrences = {}
+    selection = ui.activeSelections
+    for i in range(selection.count):
+        entity = selection.item(i).entity
+
+        occ = adsk.fusion.Occurrence.cast(entity)
+        if occ:
+            if all_occurrences:
+                component = occ.component
+            else:
+                occurrences[occ.fullPathName] = occ
+                continue
+        else:
+            component = adsk.fusion.Component.cast(entity)
+            if not component or not all_occurrences:
+                continue
+
+        for other in get_occurrence_index(design).get(component.id, []):
+            occurrences[other.fullPathName] = other
+
+    return list(occurrences.values())
+
+
+def rotate_transform(xform: adsk.core.Matrix3D, angle: float) -> adsk.core.Matrix3D:
+    """Rotates a transform about the Z axis through its own origin and returns it."""
+    origin = xform.translation
+    xform.translation = adsk.core.Vector3D.create(0, 0, 0)
+    rot = adsk.core.Matrix3D.create()
+    rot.setToRotation(angle, adsk.core.Vector3D.create(0, 0, 1), adsk.core.Point3D.create(0, 0, 0))
+    xform.transformBy(rot)
+    xform.translation = origin
+    return xform
+
+def get_component_box(component: adsk.fusion.Component) -> tuple:
+    """Returns a component's bounding box as a (min x, min y, min z, max x, max y, max z) tuple, reading it only once per component."""
+    box = _component_boxes.get(component.id)
+    if box is None:
+        bounding_box = component.boundingBox
+        low = bounding_box.minPoint
+        high = bounding_box.maxPoint
+        box = _component_boxes[component.id] = (low.x, low.y, low.z, high.x, high.y, high.z)
+    return box
+
+
+def get_proxy_coordinates(component: adsk.fusion.Component) -> adsk.fusion.CustomGraphicsCoordinates:
+    """Returns the corners of a component's bounding box as graphics coordinates, creating them only once per component."""
+    coordinates = _proxy_coordinates.get(component.id)
+    if coordinates is None:
+        box = get_component_box(component)
+        corners = []
+        for i in range(8):
+            corners.extend((box[3] if i & 1 else box[0],
+                            box[4] if i & 2 else box[1],
+                            box[5] if i & 4 else box[2]))
+        coordinates = _proxy_coordinates[component.id] = adsk.fusion.CustomGraphicsCoordinates.create(corners)
+    return coordinates
+
+
+def clear_preview_graphics():
+    global _preview_graphics
+    if _preview_graphics is not None and _preview_graphics.isValid:
+        _preview_graphics.deleteMe()
+    _preview_graphics = None
+
+
+def draw_proxies(design: adsk.fusion.Design, occurrences: list, angle: float):
+    """Draws the bounding box of each occurrence rotated by angle, replacing the previous preview."""
+    global _preview_graphics
+    clear_preview_graphics()
+    _preview_graphics = design.rootComponent.customGraphicsGroups.add()
+    color = adsk.fusion.CustomGraphicsSolidColorEffect.create(adsk.core.Color.create(0, 128, 255, 255))
+    for occ in occurrences:
+        lines = _preview_graphics.addLines(get_proxy_coordinates(occ.component), BOX_EDGES, False)
+        lines.transform = rotate_transform(occ.transform2, angle)
+        lines.color = color
+
+
+def world_box(occ: adsk.fusion.Occurrence) -> tuple:
+    """Returns the bounding box of an occurrence in the space of the root component."""
+    return bvh.transform_box(get_component_box(occ.component), occ.transform2.asArray())
+
+
+def find_interference_candidates(design: adsk.fusion.Design, moved: list) -> list:
+    """Finds the occurrences whose bounding boxes overlap the moved occurrences.
+
+    The other occurrences exclude the parents and children of the moved ones, since
+    their boxes always contain each other.
+
+    :returns:
+        A list of (moved occurrence, other occurrence) tuples to check exactly.
+    """
+    moved_paths = {occ.fullPathName for occ in moved}
+    related = set()
+    for path in moved_paths:
+        parts = path.split('+')
+        related.update('+'.join(parts[:i]) for i in range(1, len(parts)))
+
+    others = []
+    for occurrences in get_occurrence_index(design).values():
+        for occ in occurrences:
+            path = occ.fullPathName
+            if path in moved_paths or path in related:
+                continue
+            parts = path.split('+')
+            if any('+'.join(parts[:i]) in moved_paths for i in range(1, len(parts))):
+                continue
+            others.append(occ)
+
+    pairs = bvh.find_candidate_pairs([world_box(occ) for occ in moved], [world_box(occ) for occ in others])
+    return [(moved[i], others[j]) for i, j in pairs]
+
+
+def select_candidates(pairs: list):
+    """Selects the occurrences in the candidate pairs so they can be checked with Inspect > Interference."""
+    selections = ui.activeSelections
+    selections.clear()
+    selected = set()
+    for pair in pairs:
+        for occ in pair:
+            if occ.fullPathName not in selected:
+                selected.add(occ.fullPathName)
+                selections.add(occ)
+
 
 def addPoint3d(p1: adsk.core.Point3D, p2: adsk.core.Point3D):
     return adsk.core.Point3D.create(p1.x + p2.x, p1.y + p2.y, p1.z + p2.z)
@@ -101,114 +250,62 @@ def scalePoint3d(p: adsk.core.Point3D, scale: float):
 def Point3dToString(p: adsk.core.Point3D):
     return f"({p.x}, {p.y}, {p.z})"
 
-def object_fields_to_string(obj):
-    result = []
-    for attribute in dir(obj):
-        # Exclude magic methods and attributes
-        if not attribute.startswith('__'):
-            value = getattr(obj, attribute)
-            if value is None:
-                result.append(f"{attribute}: None")
-            else:
-                result.append(f"{attribute}: {value}")
-    return '\n'.join(result)
-
 # This event handler is called when the user clicks the OK button in the command dialog or 
 # is immediately called after the created event not command inputs were created for the dialog.
+@command.on_execute
 def command_execute(args: adsk.core.CommandEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Execute Event')
+    angle = command.inputs.value('angle')
+    clear_preview_graphics()
 
-    # TODO ******************************** Your code here ********************************
+    design = adsk.fusion.Design.cast(app.activeProduct)
+    if not design:
+        return
 
-    # Get a reference to your command's inputs.
-    inputs = args.command.commandInputs
-    tb: adsk.core.AngleValueCommandInput = inputs.itemById('angle')
-    # value_input: adsk.core.ValueCommandInput = inputs.itemById('value_input')
-    
-    # get the selected componenets
-    selection = ui.activeSelections
-    # list how many items are selected and their names and the type of object they are
-    # Collect information
+    # Collect the occurrences and their initial transformations.
     occurrences_to_modify = []
-    for i in range(selection.count):
-        item = selection.item(i)
-        if item.entity.objectType == "adsk::fusion::Occurrence":
-            occ = adsk.fusion.Occurrence.cast(item.entity)
-            if occ:
-                # Store the occurrence and its initial transformation
-                occurrences_to_modify.append((occ, occ.transform2))
+    for occ in get_selected_occurrences(design, command.inputs.bool_value('all_occurrences')):
+        occurrences_to_modify.append((occ, occ.transform2))
 
     # Apply modifications
     for occ, initial_xform in occurrences_to_modify:
         try:
-            # Your transformation logic...
-            xform = initial_xform
-            origin = xform.translation
-            
-            xform.translation = adsk.core.Vector3D.create(0, 0, 0)
-            rot = adsk.core.Matrix3D.create()
-            rot.setToRotation(tb.value, adsk.core.Vector3D.create(0, 0, 1), adsk.core.Point3D.create(0, 0, 0))
-            xform.transformBy(rot)
-            xform.translation = origin
-
-            # Apply the new transformation
-            # Make sure this is the correct method to apply a new transformation
-            occ.transform2 = xform
-            
-            # Update your text box
-            tb.text += f"Rotated occurrence {occ.name} by 90 degrees\n"
+            occ.transform2 = rotate_transform(initial_xform, angle)
         except Exception as e:
-            tb.text += f"Error: {str(e)}\n"
+            futil.log(f'{CMD_NAME} failed to rotate {occ.name}: {e}')
             break
 
+    futil.log(f'{CMD_NAME} rotated {len(occurrences_to_modify)} occurrences by {angle} radians')
 
-    # Do something interesting
-    # text = text_box.text
-    # expression = value_input.expression
-    # msg = f'Your text: {text}
-    ui.messageBox(text_box.text)
+    if command.inputs.bool_value('check_interference'):
+        pairs = find_interference_candidates(design, [occ for occ, _ in occurrences_to_modify])
+        select_candidates(pairs)
+        futil.log(f'{CMD_NAME} found {len(pairs)} possible collisions')
+        for moved, other in pairs:
+            futil.log(f'  {moved.fullPathName} / {other.fullPathName}')
 
 
 # This event handler is called when the command needs to compute a new preview in the graphics window.
+@command.on_preview
 def command_preview(args: adsk.core.CommandEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Preview Event')
-    inputs = args.command.commandInputs
-
-    
+    if not command.inputs.bool_value('fast_preview'):
+        clear_preview_graphics()
+        return
 
+    design = adsk.fusion.Design.cast(app.activeProduct)
+    if not design:
+        return
 
-# This event handler is called when the user changes anything in the command dialog
-# allowing you to modify values of other inputs based on that change.
-def command_input_changed(args: adsk.core.InputChangedEventArgs):
-    changed_input = args.input
-    inputs = args.inputs
+    draw_proxies(design, get_selected_occurrences(design, command.inputs.bool_value('all_occurrences')),
+                 command.inputs.value('angle'))
 
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Input Changed Event fired from a change to {changed_input.id}')
+    # The boxes only stand in for the rotation, so execute still has to move the occurrences.
+    args.isValidResult = False
 
 
-# This event handler is called when the user interacts with any of the inputs in the dialog
-# which allows you to verify that all of the inputs are valid and enables the OK button.
-def command_validate_input(args: adsk.core.ValidateInputsEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Validate Input Event')
-
-    inputs = args.inputs
-    
-    # Verify the validity of the input values. This controls if the OK button is enabled or not.
-    valueInput = inputs.itemById('value_input')
-    if valueInput.value >= 0:
-        args.areInputsValid = True
-    else:
-        args.areInputsValid = False
-        
-
 # This event handler is called when the command terminates.
+@command.on_destroy
 def command_destroy(args: adsk.core.CommandEventArgs):
-    # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Destroy Event')
-
-    global local_handlers
-    local_handlers = []
+    clear_preview_graphics()
+    clear_occurrence_index()
+    _component_boxes.clear()
+    _proxy_coordinates.clear()
@@ -0,0 +1,270 @@
+import adsk.core
+import adsk.fusion
+import os
+import re
+import time
+from ...lib import fusion360utils as futil
+from ...lib.fusion360utils import sketch_snapshot as snapshot
+from ...lib.fusion360utils import sketch_geometry as geometry
+from ..addRadsToSketch import entry as add_rads
+from ... import config
+app = adsk.core.Application.get()
+ui = app.userInterface
+
+
+CMD_ID = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_sketchSnapshot'
+CMD_NAME = 'Export Sketch Snapshot'
+CMD_Description = 'Save sketch geometry to snapshot files that can be analysed without Fusion'
+
+# Specify that the command will be promoted to the panel.
+IS_PROMOTED = False
+
+# This is done by specifying the workspace, the tab, and the panel, and the
+# command it will be inserted beside. Not providing the command to position it
+# will insert it at the end.
+WORKSPACE_ID = 'FusionSolidEnvironment'
+PANEL_ID = 'SolidScriptsAddinsPanel'
+COMMAND_BESIDE_ID = 'ScriptsManagerCommand'
+
+# Resource location for command icons, here we assume a sub folder in this directory named "resources".
+ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', '')
+
+# The extension of the files written by the command.
+SNAPSHOT_EXTENSION = '.zsks'
+
+# The command definition, its button and the events of each command session.
+command = futil.FusionCommand(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER,
+                              workspace_id=WORKSPACE_ID, panel_id=PANEL_ID,
+                              command_beside_id=COMMAND_BESIDE_ID, is_promoted=IS_PROMOTED)
+
+
+# Executed when add-in is run.
+def start():
+    command.start()
+
+
+# Executed when add-in is stopped.
+def stop():
+    command.stop()
+
+
+# Function that is called when a user clicks the corresponding button in the UI.
+# This defines the contents of the command dialog. The command related events are connected by the command.
+@command.on_created
+def command_created(args: adsk.core.CommandCreatedEventArgs):
+    inputs = args.command.commandInputs
+
+    # Exports every sketch in every component when checked, otherwise only the sketch being edited.
+    inputs.addBoolValueInput('design_wide', 'All Sketches in Design', True, '', False)
+
+    tb = inputs.addTextBoxCommandInput('text_box', 'Sketches', '', 10, True)
+    tb.isFullWidth = True
+
+    update_summary()
+
+
+def get_target_sketches() -> list:
+    design = adsk.fusion.Design.cast(app.activeProduct)
+    if not design:
+        return []
+
+    if not command.inputs.bool_value('design_wide'):
+        sketch = adsk.fusion.Sketch.cast(design.activeEditObject)
+        return [sketch] if sketch else []
+
+    sketches = []
+    components = design.allComponents
+    for i in range(components.count):
+        component_sketches = components.item(i).sketches
+        sketches.extend(component_sketches.item(j) for j in range(component_sketches.count))
+    return sketches
+
+
+def update_summary():
+    sketches = get_target_sketches()
+    lines = [f'{sketch.parentComponent.name} / {sketch.name}' for sketch in sketches]
+    lines.append(f'{len(sketches)} sketches to export')
+    command.inputs.set_text('text_box', '\n'.join(lines))
+
+
+def _end_points(curve: adsk.fusion.SketchCurve) -> tuple:
+    """Returns the start and end sketch points of a curve, or None for curves like circles that don't have them."""
+    for cast in (adsk.fusion.SketchLine.cast, adsk.fusion.SketchArc.cast,
+                 adsk.fusion.SketchFittedSpline.cast, adsk.fusion.SketchFixedSpline.cast):
+        typed = cast(curve)
+        if typed:
+            return typed.startSketchPoint, typed.endSketchPoint
+    return None, None
+
+
+def _fillet_tag(curve: adsk.fusion.SketchCurve) -> tuple:
+    """Returns the (corner x, corner y, radius) tag Add Rads to Sketch put on a curve, or None."""
+    if adsk.fusion.SketchLine.cast(curve):
+        return None
+    tag = add_rads.read_fillet_tag(curve)
+    if not tag:
+        return None
+    x, y = (float(value) for value in tag['key'].split(','))
+    return x, y, tag['radius']
+
+
+def _curve_kind(curve: adsk.fusion.SketchCurve) -> int:
+    if adsk.fusion.SketchLine.cast(curve):
+        return snapshot.KIND_LINE
+    if adsk.fusion.SketchArc.cast(curve):
+        return snapshot.KIND_ARC
+    if adsk.core.NurbsCurve3D.cast(curve.geometry):
+        return snapshot.KIND_SPLINE
+    return snapshot.KIND_OTHER
+
+
+def _position_key(point: adsk.core.Point3D) -> str:
+    return geometry.corner_key(point.x, point.y)
+
+
+def _find(candidates: dict, key: str, entity) -> int:
+    """Returns the index stored for an entity under a position key, or -1 if it isn't there.
+
+    Only the few entities at the same position are compared, with == since entity
+    tokens can't be compared.
+    """
+    for candidate, index in candidates.get(key, ()):
+        if candidate == entity:
+            return index
+    return -1
+
+
+def read_sketch_data(sketch: adsk.fusion.Sketch) -> snapshot.SketchData:
+    """Reads the points, curves and profile loops of a sketch into plain lists.
+
+    The points of each curve and the curve of each loop segment are found by looking
+    the entity up by its position and comparing it with the entities found there.
+    """
+    data = snapshot.SketchData(sketch.name)
+
+    points = {}
+    sketch_points = sketch.sketchPoints
+    for i in range(sketch_points.count):
+        point = sketch_points.item(i)
+        position = point.geometry
+        index = data.add_point(position.x, position.y, position.z)
+        points.setdefault(_position_key(position), []).append((point, index))
+
+    def point_index(point: adsk.fusion.SketchPoint) -> int:
+        if not point:
+            return -1
+        position = point.geometry
+        key = _position_key(position)
+        index = _find(points, key, point)
+        if index < 0:
+            # Every end point should be one of the sketch points, but add it rather than lose it.
+            index = data.add_point(position.x, position.y, position.z)
+            points.setdefault(key, []).append((point, index))
+        return index
+
+    curves = {}
+
+    def add_curve(curve: adsk.fusion.SketchCurve, key: str, start: adsk.core.Point3D, end: adsk.core.Point3D) -> int:
+        start_point, end_point = _end_points(curve)
+        start_index = point_index(start_point)
+        end_index = point_index(end_point)
+
+        kind = _curve_kind(curve)
+        tag = _fillet_tag(curve)
+        if kind == snapshot.KIND_ARC:
+            arc = adsk.fusion.SketchArc.cast(curve)
+            center = arc.centerSketchPoint.geometry
+            index = data.add_curve(kind, start_index, end_index, start.x, start.y, end.x, end.y,
+                                   center.x, center.y, arc.radius, tag=tag)
+        elif kind == snapshot.KIND_SPLINE:
+            control_points = [(point.x, point.y, point.z) for point in adsk.core.NurbsCurve3D.cast(curve.geometry).controlPoints]
+            index = data.add_curve(kind, start_index, end_index, start.x, start.y, end.x, end.y,
+                                   control_points=control_points, tag=tag)
+        else:
+            index = data.add_curve(kind, start_index, end_index, start.x, start.y, end.x, end.y, tag=tag)
+        curves.setdefault(key, []).append((curve, index))
+        return index
+
+    sketch_curves = sketch.sketchCurves
+    for i in range(sketch_curves.count):
+        curve = sketch_curves.item(i)
+        _, start, end = curve.geometry.evaluator.getEndPoints()
+        add_curve(curve, _position_key(start), start, end)
+
+    # Profile curves can be trimmed parts of sketch curves, so the loops keep their own end points.
+    profiles = sketch.profiles
+    for i in range(profiles.count):
+        profile_loops = profiles.item(i).profileLoops
+        for j in range(profile_loops.count):
+            profile_curves = profile_loops.item(j).profileCurves
+            loop_curves = []
+            loop_segments = []
+            for k in range(profile_curves.count):
+                profile_curve = profile_curves.item(k)
+                _, start, end = profile_curve.geometry.evaluator.getEndPoints()
+                loop_segments.append((start.x, start.y, end.x, end.y))
+
+                # The sketch curve is found by the start of its untrimmed geometry.
+                entity = adsk.fusion.SketchCurve.cast(profile_curve.sketchEntity)
+                _, entity_start, entity_end = entity.geometry.evaluator.getEndPoints()
+                key = _position_key(entity_start)
+                index = _find(curves, key, entity)
+                if index < 0:
+                    index = add_curve(entity, key, entity_start, entity_end)
+                loop_curves.append(index)
+            data.add_loop(loop_curves, loop_segments)
+
+    return data
+
+
+def snapshot_file_name(sketch: adsk.fusion.Sketch, used: set) -> str:
+    """Returns a file name for a sketch that isn't in used, and adds it to used."""
+    base = re.sub(r'[^\w.-]+', '_', f'{sketch.parentComponent.name}_{sketch.name}')
+    name = base + SNAPSHOT_EXTENSION
+    number = 1
+    while name in used:
+        number += 1
+        name = f'{base}_{number}{SNAPSHOT_EXTENSION}'
+    used.add(name)
+    return name
+
+
+def export_sketches(sketches: list, folder: str) -> list:
+    """Writes a snapshot of each sketch to a folder.
+
+    :returns:
+        The paths of the files that were written.
+    """
+    paths = []
+    used = set()
+    for sketch in sketches:
+        path = os.path.join(folder, snapshot_file_name(sketch, used))
+        snapshot.write_snapshot(path, read_sketch_data(sketch))
+        paths.append(path)
+    return paths
+
+
+# This event handler is called when the user clicks the OK button in the command dialog or
+# is immediately called after the created event not command inputs were created for the dialog.
+@command.on_execute
+def command_execute(args: adsk.core.CommandEventArgs):
+    sketches = get_target_sketches()
+    if not sketches:
+        return
+
+    dialog = ui.createFolderDialog()
+    dialog.title = 'Save Sketch Snapshots'
+    if dialog.showDialog() != adsk.core.DialogResults.DialogOK:
+        return
+
+    start = time.perf_counter()
+    paths = export_sketches(sketches, dialog.folder)
+    futil.log(f'{CMD_NAME} wrote {len(paths)} snapshots to {dialog.folder} in {time.perf_counter() - start:.2f}s')
+
+
+# This event handler is called when the user changes anything in the command dialog
+# allowing you to modify values of other inputs based on that change.
+@command.on_input_changed
+def command_input_changed(args: adsk.core.InputChangedEventArgs):
+    if args.input.id == 'design_wide':
+        update_summary()
@@ -10,6 +10,17 @@ import os
 # are ready to distribute it.
 DEBUG = True
 
+# Flag that turns on memory tracking with tracemalloc. Snapshots are taken when
+# commands are created and destroyed and the growth between sessions can be
+# viewed with the Memory Report command. Tracking slows Python down noticeably,
+# so only enable it while looking for leaks.
+MEMORY_TRACKING = False
+
+# Flag that turns on recording of every command event, with its timing and the
+# input values, to a file in the temp folder. event_replay.py in lib/fusion360utils
+# replays a command's events offline and times them against the recorded latency.
+RECORD_EVENTS = False
+
 # Gets the name of the add-in from the name of the folder the py file is in.
 # This is used when defining unique internal names for various UI elements 
 # that need a unique name. It's also recommended to use a company name as 
@@ -1,2 +1,5 @@
 from .general_utils import *
 from .event_utils import *
+from .inspect_utils import *
+from .memory_utils import *
+from .command_utils import *
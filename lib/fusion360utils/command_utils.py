@@ -0,0 +1,305 @@
+from typing import Callable
+
+import adsk.core
+from .general_utils import log
+from .event_utils import add_handler
+from .memory_utils import memory_checkpoint
+
+app = adsk.core.Application.get()
+ui = app.userInterface
+
+# Toolbar panels shared by every command, keyed by (workspace id, panel id), so
+# that each panel is only looked up once no matter how many commands use it.
+_panels = {}
+
+# The optional command events and the message logged when each one fires.
+_EVENT_LABELS = {
+    'execute': 'Command Execute Event',
+    'executePreview': 'Command Preview Event',
+    'validateInputs': 'Validate Input Event',
+}
+
+
+def get_panel(workspace_id: str, panel_id: str) -> adsk.core.ToolbarPanel:
+    """Returns the toolbar panel with the given id in a workspace, looking it up only once.
+
+    Arguments:
+    workspace_id -- The id of the workspace the panel is in.
+    panel_id -- The id of the panel.
+    """
+    key = (workspace_id, panel_id)
+    panel = _panels.get(key)
+    if panel is None:
+        workspace = ui.workspaces.itemById(workspace_id)
+        panel = workspace.toolbarPanels.itemById(panel_id)
+        _panels[key] = panel
+    return panel
+
+
+def clear_panels():
+    """Clears the cached toolbar panels.
+    """
+    _panels.clear()
+
+
+class CommandInputMap:
+    """Maps input ids to the inputs of a command, including the inputs inside groups and tabs.
+
+    The map is built once per command session so handlers don't have to call
+    itemById, and values read through the typed accessors are cached until the
+    input changes. Fusion only reports changes made by the user, so handlers that
+    set a value in code should do it with set_value, or call invalidate afterwards.
+    """
+
+    def __init__(self, inputs: adsk.core.CommandInputs):
+        self.inputs = inputs
+        self._by_id = {}
+        self._values = {}
+        self.refresh()
+
+    def refresh(self):
+        """Rebuilds the map, for after inputs have been added.
+        """
+        self._by_id = {}
+        self._values = {}
+        self._add_inputs(self.inputs)
+
+    def _add_inputs(self, inputs: adsk.core.CommandInputs):
+        for i in range(inputs.count):
+            command_input = inputs.item(i)
+            self._by_id[command_input.id] = command_input
+
+            container = adsk.core.GroupCommandInput.cast(command_input) or adsk.core.TabCommandInput.cast(command_input)
+            if container:
+                self._add_inputs(container.children)
+
+    def invalidate(self, input_id: str = None):
+        """Forgets the cached value of an input, or of every input if no id is given.
+        """
+        if input_id is None:
+            self._values.clear()
+        else:
+            self._values.pop(input_id, None)
+
+    def __getitem__(self, input_id: str) -> adsk.core.CommandInput:
+        command_input = self.get(input_id)
+        if command_input is None:
+            raise KeyError(input_id)
+        return command_input
+
+    def __contains__(self, input_id: str) -> bool:
+        return self.get(input_id) is not None
+
+    def get(self, input_id: str) -> adsk.core.CommandInput:
+        """Returns the input with the given id, or None if there isn't one."""
+        command_input = self._by_id.get(input_id)
+        if command_input is None:
+            # The input may have been added since the map was built.
+            self._add_inputs(self.inputs)
+            command_input = self._by_id.get(input_id)
+        return command_input
+
+    def _cached(self, input_id: str, read: Callable):
+        try:
+            return self._values[input_id]
+        except KeyError:
+            value = self._values[input_id] = read(self[input_id])
+            return value
+
+    def value(self, input_id: str):
+        """Returns the value of a value, angle, distance, slider, bool or string value input."""
+        return self._cached(input_id, lambda command_input: command_input.value)
+
+    def bool_value(self, input_id: str) -> bool:
+        return bool(self.value(input_id))
+
+    def set_value(self, input_id: str, value):
+        """Sets the value of an input and forgets its cached value."""
+        self[input_id].value = value
+        self.invalidate(input_id)
+
+    def text(self, input_id: str) -> str:
+        """Returns the text of a text box input.
+
+        This isn't cached since text boxes are mostly written by the handlers themselves.
+        """
+        return self[input_id].text
+
+    def set_text(self, input_id: str, text: str):
+        """Sets the text of a text box input."""
+        self[input_id].text = text
+
+    def selected_name(self, input_id: str) -> str:
+        """Returns the name of the selected item of a drop down input, or None if nothing is selected."""
+        def read(command_input):
+            item = command_input.selectedItem
+            return item.name if item else None
+        return self._cached(input_id, read)
+
+    def selections(self, input_id: str) -> list:
+        """Returns the selected entities of a selection input."""
+        def read(command_input):
+            return [command_input.selection(i).entity for i in range(command_input.selectionCount)]
+        return self._cached(input_id, read)
+
+
+class FusionCommand:
+    """A button command that is added to a toolbar panel and wires up its events for each session.
+
+    Handlers are registered with the on_* decorators and are connected to the
+    command every time it is created. The inputs of the current session are
+    available through the inputs attribute.
+
+    Arguments:
+    cmd_id -- The unique id of the command definition.
+    name -- The name shown on the button.
+    description -- The tooltip of the button.
+    icon_folder -- The folder with the 16x16, 32x32 and 64x64 icons.
+    workspace_id -- The workspace the button is added to.
+    panel_id -- The panel the button is added to.
+    command_beside_id -- The command the button is inserted after.
+    is_promoted -- Whether the button is promoted to the main toolbar.
+    """
+
+    def __init__(
+            self,
+            cmd_id: str,
+            name: str,
+            description: str,
+            icon_folder: str,
+            *,
+            workspace_id: str = 'FusionSolidEnvironment',
+            panel_id: str = 'SolidScriptsAddinsPanel',
+            command_beside_id: str = 'ScriptsManagerCommand',
+            is_promoted: bool = True
+    ):
+        self.cmd_id = cmd_id
+        self.name = name
+        self.description = description
+        self.icon_folder = icon_folder
+        self.workspace_id = workspace_id
+        self.panel_id = panel_id
+        self.command_beside_id = command_beside_id
+        self.is_promoted = is_promoted
+
+        # The inputs of the current command session, or None when the command isn't running.
+        self.inputs: CommandInputMap = None
+
+        # Local list of event handlers used to maintain a reference so
+        # they are not released and garbage collected.
+        self.local_handlers = []
+
+        self._handlers = {}
+
+    def on_created(self, callback: Callable) -> Callable:
+        """Registers the function that adds the inputs when the command is created."""
+        self._handlers['commandCreated'] = callback
+        return callback
+
+    def on_execute(self, callback: Callable) -> Callable:
+        self._handlers['execute'] = callback
+        return callback
+
+    def on_preview(self, callback: Callable) -> Callable:
+        self._handlers['executePreview'] = callback
+        return callback
+
+    def on_input_changed(self, callback: Callable) -> Callable:
+        self._handlers['inputChanged'] = callback
+        return callback
+
+    def on_validate_inputs(self, callback: Callable) -> Callable:
+        self._handlers['validateInputs'] = callback
+        return callback
+
+    def on_destroy(self, callback: Callable) -> Callable:
+        self._handlers['destroy'] = callback
+        return callback
+
+    @property
+    def panel(self) -> adsk.core.ToolbarPanel:
+        return get_panel(self.workspace_id, self.panel_id)
+
+    def start(self):
+        """Creates the command definition and adds its button to the panel. Called when the add-in is run.
+        """
+        cmd_def = ui.commandDefinitions.addButtonDefinition(self.cmd_id, self.name, self.description, self.icon_folder)
+
+        # Define an event handler for the command created event. It will be called when the button is clicked.
+        add_handler(cmd_def.commandCreated, self.handle_created, name=f'{self.name} commandCreated')
+
+        # Create the button command control in the UI after the specified existing command.
+        control = self.panel.controls.addCommand(cmd_def, self.command_beside_id, False)
+
+        # Specify if the command is promoted to the main toolbar.
+        control.isPromoted = self.is_promoted
+
+    def stop(self):
+        """Removes the button and the command definition. Called when the add-in is stopped.
+        """
+        command_control = self.panel.controls.itemById(self.cmd_id)
+        command_definition = ui.commandDefinitions.itemById(self.cmd_id)
+
+        # Delete the button command control
+        if command_control:
+            command_control.deleteMe()
+
+        # Delete the command definition
+        if command_definition:
+            command_definition.deleteMe()
+
+    def handle_created(self, args: adsk.core.CommandCreatedEventArgs):
+        """Starts a command session. Called by the commandCreated event, and by the event replayer.
+        """
+        log(f'{self.name} Command Created Event')
+        memory_checkpoint(self.cmd_id, self.name, 'created', self.local_handlers, self._state())
+
+        self.inputs = CommandInputMap(args.command.commandInputs)
+        created = self._handlers.get('commandCreated')
+        if created:
+            created(args)
+            self.inputs.refresh()
+
+        command = args.command
+        for event_name, label in _EVENT_LABELS.items():
+            callback = self._handlers.get(event_name)
+            if callback:
+                add_handler(getattr(command, event_name), self._logged(label, callback),
+                            name=f'{self.name} {event_name}', local_handlers=self.local_handlers)
+
+        # These are always connected so the cached input values and the session can be cleaned up.
+        add_handler(command.inputChanged, self._input_changed,
+                    name=f'{self.name} inputChanged', local_handlers=self.local_handlers)
+        add_handler(command.destroy, self._destroy,
+                    name=f'{self.name} destroy', local_handlers=self.local_handlers)
+
+    def _state(self) -> dict:
+        """Returns the globals of the module the handlers are defined in, where the command keeps its state."""
+        for callback in self._handlers.values():
+            return getattr(callback, '__globals__', {})
+        return {}
+
+    def _logged(self, label: str, callback: Callable) -> Callable:
+        def notify(args):
+            log(f'{self.name} {label}')
+            callback(args)
+        return notify
+
+    def _input_changed(self, args: adsk.core.InputChangedEventArgs):
+        log(f'{self.name} Input Changed Event fired from a change to {args.input.id}')
+        self.inputs.invalidate(args.input.id)
+
+        callback = self._handlers.get('inputChanged')
+        if callback:
+            callback(args)
+
+    def _destroy(self, args: adsk.core.CommandEventArgs):
+        log(f'{self.name} Command Destroy Event')
+
+        callback = self._handlers.get('destroy')
+        if callback:
+            callback(args)
+
+        memory_checkpoint(self.cmd_id, self.name, 'destroy', self.local_handlers, self._state())
+        self.inputs = None
+        self.local_handlers = []
@@ -0,0 +1,594 @@
+"""Records command events to a compact file and replays them offline.
+
+Recordings are gzipped JSON lines. The first line is a header and every other
+line is one event with the name of the handler that ran, the id of its command,
+the time it fired, how long the handler took and the values of the command
+inputs afterwards.
+
+This module only uses the standard library so it can be run as a script
+without Fusion. It installs a stand-in for the adsk modules, imports the command
+module from the add-in, feeds it the recorded events of its command and reports
+how long each handler took in the replay next to how long it took in Fusion:
+
+    python event_replay.py <recording> <add-in folder> <command module> [--sketch <snapshot> ...]
+
+for example
+
+    python lib/fusion360utils/event_replay.py session.events.gz . commands.addRadsToSketch.entry --sketch part.zsks
+
+Only the input values are recorded, not the design. Sketch snapshots written by
+Export Sketch Snapshot can be passed with --sketch to stand in for the design:
+they become the sketches of one component, the first one being the sketch under
+edit, so handlers that read sketch profiles run their loops over real geometry.
+Everything else, like selections and occurrences, is empty during a replay, so
+the replay timings only mean something for the handlers that work on sketches.
+They measure the add-in's own Python, without the cost of the API calls.
+
+Errors in handlers are caught and logged by event_utils like in Fusion, and the
+replay reports them against the event that raised them.
+"""
+
+import argparse
+import contextlib
+import gzip
+import importlib
+import json
+import os
+import statistics
+import sys
+import time
+import types
+
+FORMAT_VERSION = 2
+
+
+class EventLogWriter:
+    """Writes events to a recording file as they happen."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._start = time.perf_counter()
+        self._write({'v': FORMAT_VERSION, 'start': time.time()})
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def write(self, name: str, duration: float, inputs: dict, changed: str = None, cmd_id: str = None):
+        """Writes one event.
+
+        Arguments:
+        name -- The name of the handler that ran.
+        duration -- How long the handler took in seconds.
+        inputs -- The input values returned by serialize_inputs.
+        changed -- The id of the input that changed, for input changed events.
+        cmd_id -- The id of the command definition the event belongs to. Command
+                  names aren't unique, so replays match events by this id.
+        """
+        record = {'e': name, 'id': cmd_id, 't': round(time.perf_counter() - self._start, 6), 'd': round(duration, 6), 'i': inputs}
+        if changed is not None:
+            record['c'] = changed
+        self._write(record)
+
+    def close(self):
+        self._file.close()
+
+
+def read_event_log(path: str) -> tuple:
+    """Reads a recording.
+
+    :returns:
+        (header, events) where events is a list of dictionaries with the keys
+        written by EventLogWriter.write.
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        header = json.loads(file.readline())
+        if header.get('v') != FORMAT_VERSION:
+            raise ValueError(f'Unsupported event recording version {header.get("v")} in {path}')
+        events = [json.loads(line) for line in file if line.strip()]
+    return header, events
+
+
+def serialize_inputs(inputs) -> dict:
+    """Returns the values of a CommandInputs collection as a compact dictionary.
+
+    Selection inputs are stored as {'n': selection count} and drop downs as
+    {'s': selected item name}. Inputs in groups are stored at the top level.
+    Text boxes are skipped since they are output rather than input.
+    """
+    values = {}
+    _serialize_inputs(inputs, values)
+    return values
+
+
+def _serialize_inputs(inputs, values: dict):
+    for i in range(inputs.count):
+        command_input = inputs.item(i)
+        cls = type(command_input)
+        if hasattr(cls, 'children'):
+            _serialize_inputs(command_input.children, values)
+        elif hasattr(cls, 'selectionCount'):
+            values[command_input.id] = {'n': command_input.selectionCount}
+        elif hasattr(cls, 'selectedItem'):
+            item = command_input.selectedItem
+            values[command_input.id] = {'s': item.name if item else None}
+        elif hasattr(cls, 'value'):
+            value = command_input.value
+            if isinstance(value, (bool, int, float, str)):
+                values[command_input.id] = value
+
+
+class StandIn:
+    """Stands in for any Fusion API object.
+
+    Every attribute and call returns another stand-in, collections are empty and
+    the stand-in compares as zero, so handlers run through without Fusion.
+    """
+
+    # The API classes the stand-in can be cast to, or None for any class.
+    API_TYPES = None
+
+    def __init__(self, name: str = 'StandIn'):
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if name in ('count', 'selectionCount'):
+            return 0
+        return StandIn(name)
+
+    def __setattr__(self, name, value):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return StandIn(self._name)
+
+    def __iter__(self):
+        return iter(())
+
+    def __getitem__(self, key):
+        return StandIn(self._name)
+
+    def __bool__(self):
+        return True
+
+    def __float__(self):
+        return 0.0
+
+    def __int__(self):
+        return 0
+
+    def __index__(self):
+        return 0
+
+    def __lt__(self, other):
+        return False
+
+    __le__ = __gt__ = __ge__ = __lt__
+
+    def __format__(self, spec):
+        return f'<{self._name}>'
+
+    def __repr__(self):
+        return f'<{self._name}>'
+
+
+class _StandInType(type):
+    """Metaclass for stand-in API classes so class level lookups like enums and create() work."""
+
+    def __getattr__(cls, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return StandIn(f'{cls.__name__}.{name}')
+
+
+class _StandInClass(metaclass=_StandInType):
+    @classmethod
+    def cast(cls, obj):
+        api_types = getattr(obj, 'API_TYPES', None)
+        if api_types is None or cls.__name__ in api_types:
+            return obj
+        return None
+
+
+class _StandInModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        cls = _StandInType(name, (_StandInClass,), {'__module__': self.__name__})
+        setattr(self, name, cls)
+        return cls
+
+
+class StandInEventHandler:
+    """The handler type connected to StandInEvent. event_utils subclasses it like a real handler type."""
+
+    def __init__(self):
+        pass
+
+
+class StandInEvent:
+    """An event that keeps the handlers connected to it so they can be notified during a replay."""
+
+    def __init__(self):
+        self.handlers = []
+
+    def add(self, handler: 'StandInEventHandler'):
+        self.handlers.append(handler)
+        return True
+
+    def remove(self, handler: 'StandInEventHandler'):
+        self.handlers.remove(handler)
+        return True
+
+    def notify(self, args):
+        for handler in self.handlers:
+            handler.notify(args)
+
+
+class ReplayInput(StandIn):
+    """A command input that returns its recorded value."""
+
+    def __init__(self, input_id: str, value=None):
+        super().__init__(input_id)
+        object.__setattr__(self, 'id', input_id)
+        object.__setattr__(self, 'children', ReplayInputs({}))
+        object.__setattr__(self, 'isVisible', True)
+        self.set_recorded(value)
+
+    def set_recorded(self, value):
+        if isinstance(value, dict) and 'n' in value:
+            object.__setattr__(self, 'selectionCount', value['n'])
+        elif isinstance(value, dict) and 's' in value:
+            object.__setattr__(self, 'selectedItem', StandIn(value['s']) if value['s'] is not None else None)
+            if value['s'] is not None:
+                object.__setattr__(self.selectedItem, 'name', value['s'])
+        elif value is not None:
+            object.__setattr__(self, 'value', value)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+
+    def selection(self, index):
+        return StandIn('Selection')
+
+
+class ReplayInputs(StandIn):
+    """A CommandInputs collection made from recorded input values."""
+
+    def __init__(self, values: dict):
+        super().__init__('CommandInputs')
+        object.__setattr__(self, '_inputs', {input_id: ReplayInput(input_id, value) for input_id, value in values.items()})
+
+    def update(self, values: dict):
+        for input_id, value in values.items():
+            if input_id in self._inputs:
+                self._inputs[input_id].set_recorded(value)
+            else:
+                self._inputs[input_id] = ReplayInput(input_id, value)
+
+    @property
+    def count(self):
+        return len(self._inputs)
+
+    def item(self, index):
+        return list(self._inputs.values())[index]
+
+    def itemById(self, input_id):
+        return self._inputs.get(input_id)
+
+    def __getattr__(self, name):
+        # The add*Input methods return the existing input so recorded values win.
+        if name.startswith('add'):
+            def add(input_id, *args, **kwargs):
+                return self._inputs.setdefault(input_id, ReplayInput(input_id))
+            return add
+        return super().__getattr__(name)
+
+
+class ReplayCommand(StandIn):
+    """A Command whose events keep their handlers so they can be fired during a replay."""
+
+    def __init__(self, inputs: ReplayInputs):
+        super().__init__('Command')
+        object.__setattr__(self, 'commandInputs', inputs)
+        for event_name in ('execute', 'executePreview', 'inputChanged', 'validateInputs', 'destroy'):
+            object.__setattr__(self, event_name, StandInEvent())
+
+
+class ReplayEventArgs(StandIn):
+    def __init__(self, command: ReplayCommand, changed: str = None):
+        super().__init__('EventArgs')
+        object.__setattr__(self, 'command', command)
+        object.__setattr__(self, 'inputs', command.commandInputs)
+        object.__setattr__(self, 'firingEvent', StandIn('Event'))
+        object.__setattr__(self, 'input', command.commandInputs.itemById(changed) if changed else None)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+
+
+class ReplayApplication(StandIn):
+    """The application returned by adsk.core.Application.get during a replay, whose active product can be replaced."""
+
+    def __init__(self):
+        super().__init__('Application')
+        object.__setattr__(self, 'activeProduct', StandIn('Product'))
+
+
+_application = ReplayApplication()
+
+
+def install_stand_in():
+    """Installs stand-in adsk, adsk.core and adsk.fusion modules if the real ones aren't available."""
+    try:
+        import adsk.core
+        return
+    except ImportError:
+        pass
+
+    adsk = types.ModuleType('adsk')
+    adsk.__path__ = []
+    for name in ('core', 'fusion', 'cam'):
+        module = _StandInModule(f'adsk.{name}')
+        setattr(adsk, name, module)
+        sys.modules[f'adsk.{name}'] = module
+    sys.modules['adsk'] = adsk
+    adsk.core.Application = _StandInType('Application', (_StandInClass,),
+                                         {'__module__': 'adsk.core', 'get': staticmethod(lambda: _application)})
+
+
+class ReplayCollection(StandIn):
+    """An API collection over a list."""
+
+    def __init__(self, items: list):
+        super().__init__('Collection')
+        object.__setattr__(self, '_items', items)
+        object.__setattr__(self, 'count', len(items))
+
+    def item(self, index: int):
+        return self._items[index]
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+class ReplayPoint(StandIn):
+    def __init__(self, x: float, y: float, z: float = 0.0):
+        super().__init__('Point3D')
+        object.__setattr__(self, 'x', x)
+        object.__setattr__(self, 'y', y)
+        object.__setattr__(self, 'z', z)
+
+
+class ReplayCurveGeometry(StandIn):
+    """The geometry of a profile curve, a Line3D for lines and an Arc3D for anything else."""
+
+    def __init__(self, is_line: bool, x0: float, y0: float, x1: float, y1: float):
+        super().__init__('Line3D' if is_line else 'Arc3D')
+        start, end = ReplayPoint(x0, y0), ReplayPoint(x1, y1)
+        object.__setattr__(self, 'API_TYPES', (self._name, 'Curve3D'))
+        object.__setattr__(self, 'startPoint', start)
+        object.__setattr__(self, 'endPoint', end)
+        object.__setattr__(self, 'evaluator', StandIn('CurveEvaluator3D'))
+        object.__setattr__(self.evaluator, 'getEndPoints', lambda: (True, start, end))
+
+
+class ReplayAttributes(StandIn):
+    def __init__(self, attributes: dict):
+        super().__init__('Attributes')
+        object.__setattr__(self, '_attributes', attributes)
+
+    def itemByName(self, group: str, name: str):
+        value = self._attributes.get((group, name))
+        if value is None:
+            return None
+        attribute = StandIn('Attribute')
+        object.__setattr__(attribute, 'value', value)
+        return attribute
+
+
+class ReplaySketchCurve(StandIn):
+    """A sketch line or arc, with the fillet tag Add Rads to Sketch stored on it if it had one."""
+
+    def __init__(self, is_line: bool, attributes: dict):
+        super().__init__('SketchLine' if is_line else 'SketchArc')
+        object.__setattr__(self, 'API_TYPES', (self._name, 'SketchCurve', 'SketchEntity'))
+        object.__setattr__(self, 'attributes', ReplayAttributes(attributes))
+
+
+class ReplaySketch(StandIn):
+    """A sketch whose profiles are the loops of a sketch snapshot, one loop per profile."""
+
+    API_TYPES = ('Sketch',)
+
+    def __init__(self, name: str, component, profiles: list):
+        super().__init__('Sketch')
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'parentComponent', component)
+        object.__setattr__(self, 'profiles', ReplayCollection(profiles))
+        object.__setattr__(self, 'attributes', ReplayAttributes({}))
+
+
+class ReplayDesign(StandIn):
+    API_TYPES = ('Design', 'Product')
+
+    def __init__(self, components: list, active_edit_object):
+        super().__init__('Design')
+        object.__setattr__(self, 'allComponents', ReplayCollection(components))
+        object.__setattr__(self, 'rootComponent', components[0])
+        object.__setattr__(self, 'activeEditObject', active_edit_object)
+
+
+def load_snapshot_design(paths: list, fillet_attribute: tuple = None):
+    """Returns a stand-in design made from sketch snapshots.
+
+    Arguments:
+    paths -- The snapshot files. Each one becomes a sketch of a single component,
+             and the first one is the sketch under edit.
+    fillet_attribute -- The (group, name) of the attribute Add Rads to Sketch tags its
+                        fillets with. Tagged arcs in the snapshots get it with their tag.
+    """
+    try:
+        from . import sketch_snapshot
+        from . import sketch_geometry
+    except ImportError:
+        import sketch_snapshot
+        import sketch_geometry
+
+    component = StandIn('Component')
+    object.__setattr__(component, 'name', 'Snapshots')
+    sketches = []
+    for path in paths:
+        profiles = []
+        with sketch_snapshot.SketchSnapshot(path) as snapshot:
+            name = snapshot.name
+            for i in range(snapshot.loop_count):
+                segments, fillets = snapshot.loop_geometry(i)
+                tags = {fillet.segment: json.dumps({'key': fillet.key, 'radius': fillet.radius}) for fillet in fillets}
+                curves = []
+                for index, segment in enumerate(segments):
+                    is_line = segment.kind == sketch_geometry.LINE
+                    attributes = {fillet_attribute: tags[index]} if fillet_attribute and index in tags else {}
+                    curve = StandIn('ProfileCurve')
+                    object.__setattr__(curve, 'geometry', ReplayCurveGeometry(is_line, segment.x0, segment.y0,
+                                                                              segment.x1, segment.y1))
+                    object.__setattr__(curve, 'sketchEntity', ReplaySketchCurve(is_line, attributes))
+                    curves.append(curve)
+
+                loop = StandIn('ProfileLoop')
+                object.__setattr__(loop, 'profileCurves', ReplayCollection(curves))
+                profile = StandIn('Profile')
+                object.__setattr__(profile, 'profileLoops', ReplayCollection([loop]))
+                profiles.append(profile)
+        sketches.append(ReplaySketch(name, component, profiles))
+
+    object.__setattr__(component, 'sketches', ReplayCollection(sketches))
+    return ReplayDesign([component], sketches[0] if sketches else None)
+
+
+def command_events(events: list, cmd_id: str) -> list:
+    """Returns the events recorded for one command."""
+    return [event for event in events if event.get('id') == cmd_id]
+
+
+@contextlib.contextmanager
+def _captured_handler_errors(command, errors: list):
+    """Collects the errors that the command's event handlers catch and pass to handle_error.
+
+    The handlers look handle_error up in the globals of event_utils when they catch
+    something, so it is swapped there for the duration of the replay.
+    """
+    handler_globals = sys.modules[type(command).__module__].add_handler.__globals__
+    original = handler_globals['handle_error']
+
+    def handle_error(name: str, show_message_box: bool = False):
+        error = sys.exc_info()[1]
+        errors.append(f'{type(error).__name__}: {error}')
+        original(name, show_message_box)
+
+    handler_globals['handle_error'] = handle_error
+    try:
+        yield
+    finally:
+        handler_globals['handle_error'] = original
+
+
+def replay(events: list, command, design=None) -> list:
+    """Feeds the recorded events of a FusionCommand back to it and times each handler.
+
+    Events recorded for other commands are skipped.
+
+    Arguments:
+    events -- The events returned by read_event_log.
+    command -- The FusionCommand the events were recorded from.
+    design -- The stand-in design the handlers see as the active product, such as
+              the one returned by load_snapshot_design.
+
+    :returns:
+        A list of (event name, recorded seconds, replay seconds, error) tuples, where
+        error is None if the handler ran through.
+    """
+    if design is not None:
+        object.__setattr__(_application, 'activeProduct', design)
+
+    results = []
+    errors = []
+    replay_command = None
+    with _captured_handler_errors(command, errors):
+        for event in command_events(events, command.cmd_id):
+            event_name = event['e'].rsplit(' ', 1)[-1]
+
+            if event_name == 'commandCreated' or replay_command is None:
+                replay_command = ReplayCommand(ReplayInputs(event['i']))
+            else:
+                replay_command.commandInputs.update(event['i'])
+
+            args = ReplayEventArgs(replay_command, event.get('c'))
+            errors.clear()
+            start = time.perf_counter()
+            try:
+                if event_name == 'commandCreated':
+                    command.handle_created(args)
+                else:
+                    getattr(replay_command, event_name).notify(args)
+            except Exception as e:
+                errors.append(f'{type(e).__name__}: {e}')
+            duration = time.perf_counter() - start
+            results.append((event_name, event['d'], duration, '; '.join(errors) or None))
+
+    return results
+
+
+def format_results(results: list) -> str:
+    """Formats the recorded and replayed latency of each event, and any errors."""
+    lines = [f'{"#":>5} {"event":<16} {"recorded ms":>12} {"replay ms":>10}  result']
+    for index, (event_name, recorded, replayed, error) in enumerate(results):
+        lines.append(f'{index:>5} {event_name:<16} {recorded * 1000:>12.3f} {replayed * 1000:>10.3f}  {error or "ok"}')
+
+    lines.append('')
+    lines.append(f'{"event":<16} {"count":>6} {"recorded mean":>14} {"replay mean":>12} {"recorded max":>13} {"replay max":>11}')
+    for event_name in sorted({result[0] for result in results}):
+        recorded = [result[1] for result in results if result[0] == event_name]
+        replayed = [result[2] for result in results if result[0] == event_name]
+        lines.append(f'{event_name:<16} {len(recorded):>6} {statistics.mean(recorded) * 1000:>14.3f} '
+                     f'{statistics.mean(replayed) * 1000:>12.3f} {max(recorded) * 1000:>13.3f} {max(replayed) * 1000:>11.3f}')
+
+    failed = sum(1 for result in results if result[3])
+    lines.append('')
+    lines.append(f'{len(results)} events replayed, {failed} failed')
+    return '\n'.join(lines)
+
+
+def main(argv: list):
+    parser = argparse.ArgumentParser(description='Replays the recorded events of a command and times its handlers.')
+    parser.add_argument('recording')
+    parser.add_argument('addin_folder')
+    parser.add_argument('command_module', help='The module of the command, like commands.addRadsToSketch.entry.')
+    parser.add_argument('--sketch', action='append', default=[],
+                        help='A sketch snapshot to use as the design. The first one is the sketch under edit.')
+    args = parser.parse_args(argv[1:])
+
+    addin_folder = os.path.abspath(args.addin_folder)
+    install_stand_in()
+    sys.path.insert(0, os.path.dirname(addin_folder))
+    package = os.path.basename(addin_folder)
+    module = importlib.import_module(f'{package}.{args.command_module}')
+
+    design = None
+    if args.sketch:
+        fillet_attribute = (module.ATTRIBUTE_GROUP, module.ATTRIBUTE_NAME) if hasattr(module, 'ATTRIBUTE_GROUP') else None
+        design = load_snapshot_design(args.sketch, fillet_attribute)
+
+    _, events = read_event_log(args.recording)
+    results = replay(events, module.command, design)
+    if not results:
+        print(f'No events were recorded for {module.command.cmd_id}')
+        return 1
+    print(format_results(results))
+    return 1 if any(result[3] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -9,16 +9,30 @@
 #  AUTODESK, INC. DOES NOT WARRANT THAT THE OPERATION OF THE PROGRAM WILL BE
 #  UNINTERRUPTED OR ERROR FREE.
 
+import os
 import sys
+import tempfile
+import time
 from typing import Callable
 
 import adsk.core
-from .general_utils import handle_error
+from .general_utils import handle_error, log
+from .event_replay import EventLogWriter, serialize_inputs
+
+# Attempt to read RECORD_EVENTS flag from parent config.
+try:
+    from ... import config
+    RECORD_EVENTS = config.RECORD_EVENTS
+except:
+    RECORD_EVENTS = False
 
 
 # Global Variable to hold Event Handlers
 _handlers = []
 
+# The writer for the event recording in progress, if any.
+_recorder = None
+
 
 def add_handler(
         event: adsk.core.Event,
@@ -60,6 +74,47 @@ def clear_handlers():
     _handlers = []
 
 
+def start_event_recording(path: str = None):
+    """Starts recording every handled event to a file, if event recording is enabled in the config.
+
+    Recordings can be replayed offline with event_replay.py.
+
+    Arguments:
+    path -- The file to write. Defaults to a time stamped file in the temp folder.
+    """
+    global _recorder
+    if not RECORD_EVENTS or _recorder is not None:
+        return
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), f'events_{time.strftime("%Y%m%d_%H%M%S")}.events.gz')
+    _recorder = EventLogWriter(path)
+    log(f'Recording events to {path}')
+
+
+def stop_event_recording():
+    """Stops the event recording in progress and closes its file.
+    """
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+
+def _record_event(name: str, duration: float, args):
+    inputs = getattr(args, 'inputs', None)
+    if inputs is None:
+        command = getattr(args, 'command', None)
+        inputs = command.commandInputs if command is not None else None
+
+    # Input changed and validate events only give the inputs, which know their command.
+    command = getattr(args, 'command', None) or getattr(inputs, 'command', None)
+    cmd_id = command.parentCommandDefinition.id if command is not None else None
+
+    changed = getattr(args, 'input', None)
+    _recorder.write(name, duration, serialize_inputs(inputs) if inputs is not None else {},
+                    changed.id if changed is not None else None, cmd_id)
+
+
 def _create_handler(
         handler_type,
         callback: Callable,
@@ -80,9 +135,16 @@ def _define_handler(handler_type, callback, name: str = None):
             super().__init__()
 
         def notify(self, args):
+            start = time.perf_counter()
             try:
                 callback(args)
             except:
                 handle_error(name)
 
+            if _recorder is not None:
+                try:
+                    _record_event(name, time.perf_counter() - start, args)
+                except:
+                    handle_error(f'{name} recording')
+
     return Handler
@@ -0,0 +1,190 @@
+import time
+from typing import Iterator
+
+# Cache of the readable property names for each class that has been inspected.
+# Fusion API objects are SWIG proxies, so every instance of a class exposes the
+# same set of properties and it only needs to be worked out once per class.
+_schema_cache = {}
+
+# Types that are rendered directly instead of being expanded.
+_SCALAR_TYPES = (str, int, float, bool, bytes)
+
+# Geometry classes that are rendered as their coordinates instead of being expanded.
+_COORDINATE_CLASSES = ('Point3D', 'Vector3D', 'Point2D', 'Vector2D')
+
+
+def get_object_schema(obj) -> tuple:
+    """Returns the sorted names of the readable properties of an object.
+
+    The names are looked up on the class rather than the instance so no
+    property getters are run, and the result is cached per class.
+
+    Arguments:
+    obj -- The object to get the property names for.
+    """
+    cls = type(obj)
+    schema = _schema_cache.get(cls)
+    if schema is not None:
+        return schema
+
+    names = set()
+    for klass in cls.__mro__:
+        for name, member in vars(klass).items():
+            if isinstance(member, property) and not name.startswith('_'):
+                names.add(name)
+
+    # Plain Python objects don't use properties, so fall back to their attributes.
+    if not names:
+        names = {name for name in getattr(obj, '__dict__', {}) if not name.startswith('_')}
+
+    schema = tuple(sorted(names))
+    _schema_cache[cls] = schema
+    return schema
+
+
+def clear_object_schema_cache():
+    """Clears the cached property names of all inspected classes.
+    """
+    _schema_cache.clear()
+
+
+def iter_object_lines(obj, max_depth: int = 1, time_budget: float = 0.5, max_items: int = 10) -> Iterator[str]:
+    """Lazily yields one line of text for each property of an object.
+
+    Each property is read exactly once. Nested objects and collections are only
+    expanded while there is depth left, and output stops once the time budget
+    has been used so that large designs can't freeze the UI.
+
+    Arguments:
+    obj -- The object to inspect.
+    max_depth -- How many levels of nested objects to expand.
+    time_budget -- The maximum number of seconds to spend inspecting.
+    max_items -- The maximum number of items to expand for each collection.
+    """
+    deadline = time.perf_counter() + time_budget
+    yield from _iter_lines(obj, 0, max_depth, deadline, max_items)
+
+
+def object_to_string(obj, max_depth: int = 0, time_budget: float = 0.5) -> str:
+    """Returns a string with the values of all of the properties of an object.
+
+    Arguments:
+    obj -- The object to inspect.
+    max_depth -- How many levels of nested objects to expand.
+    time_budget -- The maximum number of seconds to spend inspecting.
+    """
+    return '\n'.join(iter_object_lines(obj, max_depth, time_budget))
+
+
+def dump_object(obj, target, max_depth: int = 1, time_budget: float = 2.0, chunk_lines: int = 200) -> int:
+    """Streams the properties of an object to a file or a text box in chunks.
+
+    Arguments:
+    obj -- The object to inspect.
+    target -- Either the path of a file to write or a TextBoxCommandInput,
+              which has the text appended to it.
+    max_depth -- How many levels of nested objects to expand.
+    time_budget -- The maximum number of seconds to spend inspecting.
+    chunk_lines -- The number of lines written to the target at a time.
+
+    :returns:
+        The number of lines written.
+    """
+    if isinstance(target, str):
+        with open(target, 'w', encoding='utf-8') as file:
+            return _write_chunks(obj, file.write, max_depth, time_budget, chunk_lines)
+
+    def append(text: str):
+        target.text += text
+
+    return _write_chunks(obj, append, max_depth, time_budget, chunk_lines)
+
+
+def _write_chunks(obj, write, max_depth, time_budget, chunk_lines) -> int:
+    count = 0
+    chunk = []
+    for line in iter_object_lines(obj, max_depth, time_budget):
+        chunk.append(line)
+        count += 1
+        if len(chunk) >= chunk_lines:
+            write('\n'.join(chunk) + '\n')
+            chunk = []
+    if chunk:
+        write('\n'.join(chunk) + '\n')
+    return count
+
+
+def _iter_lines(obj, depth, max_depth, deadline, max_items) -> Iterator[str]:
+    indent = '  ' * depth
+    for name in get_object_schema(obj):
+        if time.perf_counter() > deadline:
+            yield f'{indent}... (time budget exceeded)'
+            return
+
+        try:
+            value = getattr(obj, name)
+        except Exception as e:
+            yield f'{indent}{name}: <error: {e}>'
+            continue
+
+        yield f'{indent}{name}: {_format_value(value)}'
+
+        if depth < max_depth and _is_expandable(value):
+            if _is_collection(value):
+                yield from _iter_collection(value, depth + 1, max_depth, deadline, max_items)
+            else:
+                yield from _iter_lines(value, depth + 1, max_depth, deadline, max_items)
+
+
+def _iter_collection(collection, depth, max_depth, deadline, max_items) -> Iterator[str]:
+    indent = '  ' * depth
+    try:
+        count = collection.count
+    except Exception as e:
+        yield f'{indent}count: <error: {e}>'
+        return
+
+    for i in range(min(count, max_items)):
+        if time.perf_counter() > deadline:
+            yield f'{indent}... (time budget exceeded)'
+            return
+
+        try:
+            item = collection.item(i)
+        except Exception as e:
+            yield f'{indent}[{i}]: <error: {e}>'
+            continue
+
+        yield f'{indent}[{i}]: {_format_value(item)}'
+        if depth < max_depth and _is_expandable(item):
+            yield from _iter_lines(item, depth + 1, max_depth, deadline, max_items)
+    if count > max_items:
+        yield f'{indent}... {count - max_items} more'
+
+
+def _format_value(value) -> str:
+    if value is None or isinstance(value, _SCALAR_TYPES):
+        return f'{value}'
+
+    # Points and vectors are much more useful with their coordinates shown.
+    class_name = value.__class__.__name__
+    if class_name in _COORDINATE_CLASSES:
+        return f'{class_name}({", ".join(f"{c:.4f}" for c in value.asArray())})'
+
+    if _is_collection(value):
+        try:
+            return f'<{class_name} count={value.count}>'
+        except Exception as e:
+            return f'<{class_name} count=<error: {e}>>'
+
+    return f'<{class_name}>'
+
+
+def _is_collection(value) -> bool:
+    return hasattr(type(value), 'count') and hasattr(type(value), 'item')
+
+
+def _is_expandable(value) -> bool:
+    if value is None or isinstance(value, _SCALAR_TYPES + (list, tuple, dict)):
+        return False
+    return value.__class__.__name__ not in _COORDINATE_CLASSES
@@ -0,0 +1,196 @@
+import gc
+import time
+import tracemalloc
+from collections import Counter
+
+from . import event_utils
+from .general_utils import log
+
+# Attempt to read MEMORY_TRACKING flag from parent config.
+try:
+    from ... import config
+    MEMORY_TRACKING = config.MEMORY_TRACKING
+except:
+    MEMORY_TRACKING = False
+
+# Whether this add-in has turned memory tracking on. Other add-ins share the interpreter and
+# may trace memory on their own, which mustn't turn on the checkpoints of this one.
+_tracking = False
+
+# Whether tracemalloc was started by this add-in, so it is only stopped if it was.
+_started_tracemalloc = False
+
+# The snapshot taken when tracking started, used to find the top allocators overall.
+_baseline = None
+
+# The snapshot taken when each command was last destroyed, keyed by command id, used to
+# measure growth between sessions. Names aren't used since commands can share a name.
+_last_destroyed = {}
+
+# A list of summaries for every command checkpoint, oldest first.
+_history = []
+
+# Caps the history so that the tracking itself doesn't grow without bound.
+_MAX_HISTORY = 200
+
+
+def start_memory_tracking(frames: int = 5):
+    """Starts tracemalloc if memory tracking is enabled in the config.
+
+    Arguments:
+    frames -- The number of stack frames to store for each allocation.
+    """
+    global _tracking, _started_tracemalloc, _baseline
+    if not MEMORY_TRACKING or _tracking:
+        return
+
+    # Other add-ins share the interpreter and may have started tracemalloc already.
+    # The baseline is still taken so the report only covers what happened since now.
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        _started_tracemalloc = True
+    _baseline = tracemalloc.take_snapshot()
+    _tracking = True
+
+
+def stop_memory_tracking():
+    """Releases the stored snapshots, and stops tracemalloc if this add-in started it.
+    """
+    global _tracking, _started_tracemalloc, _baseline
+    if not _tracking:
+        return
+
+    _tracking = False
+    _baseline = None
+    _last_destroyed.clear()
+    _history.clear()
+    if _started_tracemalloc and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _started_tracemalloc = False
+
+
+def is_memory_tracking() -> bool:
+    """Returns True if this add-in is tracking memory and tracemalloc is still running."""
+    return _tracking and tracemalloc.is_tracing()
+
+
+def memory_checkpoint(cmd_id: str, name: str, stage: str, local_handlers: list = None, roots: dict = None):
+    """Records the memory in use at a command boundary. Does nothing unless this add-in turned tracking on.
+
+    Arguments:
+    cmd_id -- The id of the command, which checkpoints are matched by.
+    name -- The name of the command, for the log and the report.
+    stage -- The command boundary, either 'created' or 'destroy'. When a command is
+             destroyed the growth since it was last destroyed is logged.
+    local_handlers -- The list of handlers the command keeps alive, if any.
+    roots -- The variables the command keeps its state in, usually its module globals.
+             The Fusion objects reachable from them are counted for the command.
+    """
+    if not is_memory_tracking():
+        return
+
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    summary = {
+        'time': time.time(),
+        'cmd_id': cmd_id,
+        'name': name,
+        'stage': stage,
+        'current': current,
+        'peak': peak,
+        'global_handlers': len(event_utils._handlers),
+        'local_handlers': len(local_handlers) if local_handlers is not None else 0,
+        'fusion_objects': count_fusion_objects(),
+        'command_objects': count_fusion_objects_in(roots) if roots is not None else 0,
+    }
+    _history.append(summary)
+    del _history[:-_MAX_HISTORY]
+
+    if stage == 'destroy':
+        previous = _last_destroyed.get(cmd_id)
+        _last_destroyed[cmd_id] = snapshot
+        if previous is not None:
+            growth = sum(stat.size_diff for stat in snapshot.compare_to(previous, 'filename'))
+            log(f'{name} memory growth since last session: {growth / 1024:.1f} KiB, '
+                f'{summary["command_objects"]} Fusion objects held by the command, '
+                f'{summary["fusion_objects"]} live in total')
+
+
+def count_fusion_objects() -> int:
+    """Returns the number of live Python wrappers of Fusion API objects."""
+    return sum(1 for obj in gc.get_objects() if type(obj).__module__.startswith('adsk.'))
+
+
+def count_fusion_objects_in(roots: dict, max_objects: int = 100000) -> int:
+    """Returns the number of distinct Fusion API objects reachable from a set of variables.
+
+    Only lists, tuples, sets and dictionaries are followed, which is how commands keep
+    their state between events.
+
+    Arguments:
+    roots -- The variables to start from, like the globals of a command module.
+    max_objects -- Stops counting after visiting this many objects.
+    """
+    seen = set()
+    found = 0
+    stack = [value for value in roots.values() if not isinstance(value, type(gc))]
+    while stack and len(seen) < max_objects:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+
+        if type(value).__module__.startswith('adsk.'):
+            found += 1
+        elif isinstance(value, dict):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            stack.extend(value)
+    return found
+
+
+def count_objects_by_type(limit: int = 20) -> list:
+    """Returns the most common live Fusion API object types as (type name, count) tuples."""
+    counts = Counter(type(obj).__name__ for obj in gc.get_objects() if type(obj).__module__.startswith('adsk.'))
+    return counts.most_common(limit)
+
+
+def memory_report(limit: int = 10) -> str:
+    """Returns a text report of memory use since tracking started.
+
+    The report lists the top allocators, the most common live Fusion objects and
+    the checkpoints recorded for each command.
+
+    Arguments:
+    limit -- The number of allocators and object types to list.
+    """
+    if not _tracking:
+        return 'Memory tracking is off. Set MEMORY_TRACKING = True in config.py and restart the add-in.'
+    if not tracemalloc.is_tracing():
+        return 'Memory tracking was stopped by something other than this add-in.'
+
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f'Traced memory: {current / 1024:.1f} KiB (peak {peak / 1024:.1f} KiB)', '']
+
+    lines.append('Top allocators since tracking started:')
+    for stat in snapshot.compare_to(_baseline, 'lineno')[:limit]:
+        lines.append(f'  {stat}')
+
+    lines.append('')
+    lines.append('Live Fusion objects:')
+    for type_name, count in count_objects_by_type(limit):
+        lines.append(f'  {type_name}: {count}')
+
+    lines.append('')
+    lines.append('Command checkpoints:')
+    for summary in _history:
+        lines.append(f'  {time.strftime("%H:%M:%S", time.localtime(summary["time"]))} '
+                     f'{summary["name"]} {summary["stage"]}: {summary["current"] / 1024:.1f} KiB, '
+                     f'{summary["command_objects"]} Fusion objects held ({summary["fusion_objects"]} live), '
+                     f'{summary["global_handlers"]} global / {summary["local_handlers"]} local handlers')
+
+    return '\n'.join(lines)
@@ -0,0 +1,487 @@
+import math
+from typing import NamedTuple
+
+# This module only works on plain coordinates so that corner planning can run
+# outside of Fusion, on sketch snapshots as well as on live sketches. Reading
+# geometry from the API and writing the results back is left to the commands.
+
+LINE = 'line'
+CURVE = 'curve'
+
+
+class Segment(NamedTuple):
+    """A loop segment in sketch space. Only the end points of curves are used."""
+    kind: str
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+
+class Corner(NamedTuple):
+    """A corner between segment `index` and the next segment in the loop."""
+    index: int
+    x: float
+    y: float
+    turn_angle: float
+    radius: float
+
+
+def corner_key(x: float, y: float) -> str:
+    """Returns a key that identifies a corner by its position."""
+    return f'{x:.5f},{y:.5f}'
+
+
+def segment_length(segment: Segment) -> float:
+    return math.hypot(segment.x1 - segment.x0, segment.y1 - segment.y0)
+
+
+def shared_point(first: Segment, second: Segment) -> tuple:
+    """Returns the end point of first closest to an end point of second, and the far end points of both.
+
+    Profile curves aren't guaranteed to be oriented head to tail, so every pair of
+    end points is checked.
+
+    :returns:
+        (corner, first_far, second_far) as (x, y) tuples.
+    """
+    first_ends = ((first.x0, first.y0), (first.x1, first.y1))
+    second_ends = ((second.x0, second.y0), (second.x1, second.y1))
+    best = None
+    for i in (0, 1):
+        for j in (0, 1):
+            a = first_ends[i]
+            b = second_ends[j]
+            distance = (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2
+            if best is None or distance < best[0]:
+                best = (distance, i, j)
+    _, i, j = best
+    return first_ends[i], first_ends[1 - i], second_ends[1 - j]
+
+
+def turn_angle(corner: tuple, first_far: tuple, second_far: tuple) -> float:
+    """Returns the angle in radians the loop turns through at a corner.
+
+    Zero means the segments are collinear and pi means the loop doubles back on itself.
+    """
+    ux = corner[0] - first_far[0]
+    uy = corner[1] - first_far[1]
+    vx = second_far[0] - corner[0]
+    vy = second_far[1] - corner[1]
+    length = math.hypot(ux, uy) * math.hypot(vx, vy)
+    if length == 0:
+        return 0.0
+
+    # Clamp to avoid math domain errors from rounding.
+    cos_angle = max(min((ux * vx + uy * vy) / length, 1.0), -1.0)
+    return math.acos(cos_angle)
+
+
+def plan_corners(segments: list, radius: float, min_turn_angle: float = math.radians(1)) -> list:
+    """Finds the line-line corners of a closed loop that should be filleted.
+
+    Arguments:
+    segments -- The segments of the loop in order. The last segment connects to the first.
+    radius -- The fillet radius to plan for each corner.
+    min_turn_angle -- Corners that turn through less than this angle are treated as collinear and skipped.
+
+    :returns:
+        A list of Corner tuples.
+    """
+    corners = []
+    count = len(segments)
+    if count < 2:
+        return corners
+
+    for i in range(count):
+        first = segments[i]
+        second = segments[(i + 1) % count]
+        if first.kind != LINE or second.kind != LINE:
+            continue
+
+        corner, first_far, second_far = shared_point(first, second)
+        angle = turn_angle(corner, first_far, second_far)
+        if angle < min_turn_angle:
+            continue
+
+        corners.append(Corner(i, corner[0], corner[1], angle, radius))
+
+    return corners
+
+
+class Adjustment(NamedTuple):
+    """A corner whose planned radius didn't fit. A radius of zero means the corner was skipped."""
+    index: int
+    x: float
+    y: float
+    requested: float
+    radius: float
+    reason: str
+
+
+def fit_corners(segments: list, corners: list, clamp: bool = True, min_radius: float = 1e-4, margin: float = 0.99) -> tuple:
+    """Checks that each planned fillet fits between its neighbouring corners.
+
+    This runs in a single pass over the loop. A fillet of radius r at a corner with an
+    interior angle a uses r / tan(a / 2) of each of its segments. Where the fillets at
+    both ends of a segment need more than its length, the length is shared between them
+    in proportion to what they asked for.
+
+    Arguments:
+    segments -- The segments of the loop the corners were planned on.
+    corners -- The corners returned by plan_corners.
+    clamp -- If True, fillets that don't fit are reduced to the largest radius that does.
+             Otherwise they are skipped.
+    min_radius -- Fillets that would be smaller than this are skipped.
+    margin -- The fraction of each segment fillets are allowed to use, so segments aren't
+              trimmed down to nothing.
+
+    :returns:
+        (corners, adjustments) where corners are the corners to fillet with their fitted
+        radius, and adjustments is a list of Adjustment tuples.
+    """
+    count = len(segments)
+
+    # The length of each segment fillets need at its start and at its end.
+    needed_start = [0.0] * count
+    needed_end = [0.0] * count
+    tangents = []
+    for corner in corners:
+        half_interior = (math.pi - corner.turn_angle) / 2
+        tangent = corner.radius / math.tan(half_interior) if half_interior > 0 else math.inf
+        tangents.append(tangent)
+        needed_end[corner.index] = tangent
+        needed_start[(corner.index + 1) % count] = tangent
+
+    fitted = []
+    adjustments = []
+    for corner, tangent in zip(corners, tangents):
+        before = corner.index
+        after = (corner.index + 1) % count
+        available = min(
+            _share(segment_length(segments[before]) * margin, tangent, needed_start[before]),
+            _share(segment_length(segments[after]) * margin, tangent, needed_end[after]))
+
+        if tangent <= available:
+            fitted.append(corner)
+            continue
+
+        half_interior = (math.pi - corner.turn_angle) / 2
+        radius = available * math.tan(half_interior)
+        if not clamp or radius < min_radius:
+            reason = 'corner too sharp' if half_interior <= 0 else 'segments too short'
+            adjustments.append(Adjustment(corner.index, corner.x, corner.y, corner.radius, 0.0, reason))
+            continue
+
+        adjustments.append(Adjustment(corner.index, corner.x, corner.y, corner.radius, radius, 'clamped to fit'))
+        fitted.append(corner._replace(radius=radius))
+
+    return fitted, adjustments
+
+
+def _share(length: float, needed: float, other: float) -> float:
+    """Returns how much of a segment a fillet can use when the fillet at its other end needs some of it too."""
+    if needed + other <= length:
+        return length - other
+    if math.isinf(other):
+        return 0.0
+    if math.isinf(needed):
+        return max(length - other, 0.0)
+    return length * needed / (needed + other)
+
+
+class Run(NamedTuple):
+    """Consecutive line segments of a loop that can be replaced by a single line.
+
+    The run covers segments start to start + count - 1, wrapping around the end of
+    the loop, and the line that replaces them goes from (x0, y0) to (x1, y1).
+    """
+    start: int
+    count: int
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+
+def find_collinear_runs(segments: list, tolerance: float, max_turn_angle: float = math.radians(20)) -> list:
+    """Finds runs of nearly collinear lines in a closed loop, like the ones left by DXF imports.
+
+    The loop is cut into chains of lines at curves and at sharp corners, then each
+    chain is simplified with Douglas-Peucker, so a run is only merged if none of its
+    inner points are further than tolerance from the new line.
+
+    Arguments:
+    segments -- The segments of the loop in order. The last segment connects to the first.
+    tolerance -- The furthest an inner point of a run may be from the line that replaces it.
+    max_turn_angle -- Corners that turn through more than this angle are never merged.
+
+    :returns:
+        A list of Run tuples, each covering at least two segments.
+    """
+    count = len(segments)
+    if count < 3 or tolerance <= 0:
+        return []
+
+    # joined[i] is True when segment i continues into the next segment as part of a chain.
+    joined = []
+    for i in range(count):
+        first = segments[i]
+        second = segments[(i + 1) % count]
+        joined.append(first.kind == LINE and second.kind == LINE
+                      and turn_angle(*shared_point(first, second)) <= max_turn_angle)
+
+    if all(joined):
+        # Start at the sharpest corner so the loop isn't cut in the middle of a run.
+        sharpest = max(range(count), key=lambda i: turn_angle(*shared_point(segments[i], segments[(i + 1) % count])))
+        chains = [((sharpest + 1) % count, count)]
+    else:
+        chains = []
+        for start in range(count):
+            if segments[start].kind == LINE and not joined[start - 1]:
+                length = 1
+                while joined[(start + length - 1) % count]:
+                    length += 1
+                chains.append((start, length))
+
+    runs = []
+    for start, length in chains:
+        if length < 2:
+            continue
+        points = _chain_points([segments[(start + k) % count] for k in range(length)])
+        kept = _douglas_peucker(points, tolerance)
+        for a, b in zip(kept, kept[1:]):
+            if b - a > 1:
+                runs.append(Run((start + a) % count, b - a, *points[a], *points[b]))
+    return runs
+
+
+def merge_runs(segments: list, runs: list) -> list:
+    """Returns the segments of a loop with each run replaced by a single line."""
+    replaced = {run.start: Segment(LINE, run.x0, run.y0, run.x1, run.y1) for run in runs}
+    merged = _merged_indices(runs, len(segments))
+    return [replaced.get(i, segment) for i, segment in enumerate(segments) if i not in merged]
+
+
+def merged_index_map(runs: list, count: int) -> dict:
+    """Returns where each segment of a loop that survives merge_runs ends up in the merged loop."""
+    merged = _merged_indices(runs, count)
+    kept = [i for i in range(count) if i not in merged]
+    return {old: new for new, old in enumerate(kept)}
+
+
+def _merged_indices(runs: list, count: int) -> set:
+    """Returns the indices of the segments merge_runs removes. The first segment of each run is reused."""
+    return {(run.start + k) % count for run in runs for k in range(1, run.count)}
+
+
+def _chain_points(chain: list) -> list:
+    """Returns the points a chain of at least two connected segments passes through, in order."""
+    corner, first_far, _ = shared_point(chain[0], chain[1])
+    points = [first_far, corner]
+    for first, second in zip(chain[1:], chain[2:]):
+        points.append(shared_point(first, second)[0])
+    points.append(shared_point(chain[-1], chain[-2])[1])
+    return points
+
+
+def _douglas_peucker(points: list, tolerance: float) -> list:
+    """Returns the indices of the points to keep, always including the first and last points."""
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+
+    # An explicit stack, since long imported chains would run past the recursion limit.
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        (x0, y0), (x1, y1) = points[first], points[last]
+        dx = x1 - x0
+        dy = y1 - y0
+        length = math.hypot(dx, dy)
+        farthest = first
+        distance = -1.0
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if length == 0:
+                d = math.hypot(px - x0, py - y0)
+            else:
+                d = abs(dx * (py - y0) - dy * (px - x0)) / length
+            if d > distance:
+                farthest, distance = i, d
+
+        if distance > tolerance:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+
+    return [i for i, kept in enumerate(keep) if kept]
+
+
+class Fillet(NamedTuple):
+    """A fillet arc added by an earlier run, with the corner id and radius stored on it.
+
+    segment is the index of the arc in its loop. Once the arc has been collapsed back
+    into the corner it rounds, index is that corner in the collapsed loop and (x, y)
+    is where the corner is now.
+    """
+    segment: int
+    key: str
+    radius: float
+    index: int = -1
+    x: float = 0.0
+    y: float = 0.0
+
+
+def collapse_fillets(segments: list, fillets: list) -> tuple:
+    """Replaces each fillet arc between two lines with the sharp corner it rounds.
+
+    The lines on either side are extended to meet, so the corners can be planned again
+    as if they had never been filleted. Arcs that aren't between two lines, or whose
+    lines are parallel, are left in the loop.
+
+    :returns:
+        (segments, kept, fillets) where kept holds the index in the original loop of
+        each segment of the collapsed loop, and fillets are the collapsed fillets with
+        their corner index and position set.
+    """
+    count = len(segments)
+    ends = [[(segment.x0, segment.y0), (segment.x1, segment.y1)] for segment in segments]
+    collapsed = {}
+    for fillet in fillets:
+        before = (fillet.segment - 1) % count
+        after = (fillet.segment + 1) % count
+        if count < 3 or segments[before].kind != LINE or segments[after].kind != LINE:
+            continue
+        arc = segments[fillet.segment]
+        corner = _intersect(segments[before], segments[after])
+        if corner is None:
+            continue
+
+        # Move the end of each line that touches the arc to the corner.
+        for neighbour in (before, after):
+            segment = segments[neighbour]
+            touching, _, _ = shared_point(segment, arc)
+            ends[neighbour][0 if touching == (segment.x0, segment.y0) else 1] = corner
+        collapsed[fillet.segment] = (fillet, corner)
+
+    kept = [i for i in range(count) if i not in collapsed]
+    position = {old: new for new, old in enumerate(kept)}
+    result = [segments[i]._replace(x0=ends[i][0][0], y0=ends[i][0][1], x1=ends[i][1][0], y1=ends[i][1][1]) for i in kept]
+
+    # The corner a fillet rounds lies between the line before it and the line after it.
+    placed = [fillet._replace(index=position[(segment - 1) % count], x=corner[0], y=corner[1])
+              for segment, (fillet, corner) in collapsed.items()]
+    return result, kept, placed
+
+
+def _intersect(first: Segment, second: Segment) -> tuple:
+    """Returns the point where the lines through two segments cross, or None if they are parallel."""
+    dx0 = first.x1 - first.x0
+    dy0 = first.y1 - first.y0
+    dx1 = second.x1 - second.x0
+    dy1 = second.y1 - second.y0
+    denominator = dx0 * dy1 - dy0 * dx1
+    if abs(denominator) < 1e-12 * (math.hypot(dx0, dy0) * math.hypot(dx1, dy1) or 1):
+        return None
+    t = ((second.x0 - first.x0) * dy1 - (second.y0 - first.y0) * dx1) / denominator
+    return first.x0 + t * dx0, first.y0 + t * dy0
+
+
+def diff_fillets(corners: list, fillets: list, tolerance: float = 1e-5) -> tuple:
+    """Compares the planned corners of a collapsed loop with the fillets it already has.
+
+    Arguments:
+    corners -- The fitted corners planned on the loop returned by collapse_fillets.
+    fillets -- The collapsed fillets returned by collapse_fillets.
+    tolerance -- Corners that moved less than this, and radii closer than this, are treated as unchanged.
+
+    :returns:
+        (added, updated, removed) where added are corners without a fillet, updated are
+        (fillet, corner) pairs whose corner moved or whose radius changed, and removed are
+        fillets on corners that shouldn't be filleted anymore.
+    """
+    planned = {corner.index: corner for corner in corners}
+    updated = []
+    removed = []
+    for fillet in fillets:
+        corner = planned.pop(fillet.index, None)
+        if corner is None:
+            removed.append(fillet)
+            continue
+
+        # The key only keeps five decimals, so compare positions rather than keys.
+        x, y = (float(value) for value in fillet.key.split(','))
+        if math.hypot(x - corner.x, y - corner.y) > tolerance or abs(fillet.radius - corner.radius) > tolerance:
+            updated.append((fillet, corner))
+    return list(planned.values()), updated, removed
+
+
+def plan_loop(segments: list, fillets: list, radius: float, min_turn_angle: float, clamp: bool, merge_tolerance: float = 0) -> tuple:
+    """Plans the corners of a loop and fits their radii so no fillet can fail in Fusion.
+
+    This is the whole analysis Add Rads to Sketch runs on each loop. plan_sketch runs it
+    on every loop of a sketch, so it gives the same results on a live sketch and on a
+    loaded snapshot.
+
+    Arguments:
+    segments -- The segments of the loop in order.
+    fillets -- The Fillet tuples for the arcs in the loop that were added by an earlier run.
+    radius -- The fillet radius to plan for each corner.
+    min_turn_angle -- Corners that turn through less than this angle are skipped.
+    clamp -- Whether fillets that don't fit are reduced to fit or skipped.
+    merge_tolerance -- If above zero, runs of nearly collinear lines are found first and the
+                       corners are planned as if they had already been merged.
+
+    :returns:
+        (kept, corners, adjustments, runs, added, updated, removed), see collapse_fillets,
+        fit_corners, find_collinear_runs and diff_fillets.
+    """
+    runs = find_collinear_runs(segments, merge_tolerance)
+    if runs:
+        index_map = merged_index_map(runs, len(segments))
+        segments = merge_runs(segments, runs)
+        fillets = [fillet._replace(segment=index_map[fillet.segment]) for fillet in fillets]
+
+    segments, kept, fillets = collapse_fillets(segments, fillets)
+    corners = plan_corners(segments, radius, min_turn_angle)
+    corners, adjustments = fit_corners(segments, corners, clamp)
+    return (kept, corners, adjustments, runs) + diff_fillets(corners, fillets)
+
+
+def plan_sketch(loops: list, radius: float, min_turn_angle: float, clamp: bool, merge_tolerance: float = 0) -> list:
+    """Runs plan_loop on every loop of a sketch.
+
+    Neighbouring profiles share curves, so the same corner can be planned by two loops.
+    Only the first copy of each corner is kept in added, updated and removed, so every
+    corner is changed once.
+
+    Arguments:
+    loops -- A (segments, fillets) tuple for each loop of the sketch, as taken by plan_loop.
+    The other arguments are passed on to plan_loop.
+
+    :returns:
+        A list with the result of plan_loop for each loop, in the same order.
+    """
+    seen = set()
+
+    def unique(items: list, corner) -> list:
+        result = []
+        for item in items:
+            key = corner_key(*corner(item))
+            if key not in seen:
+                seen.add(key)
+                result.append(item)
+        return result
+
+    results = []
+    for segments, fillets in loops:
+        kept, corners, adjustments, runs, added, updated, removed = plan_loop(
+            segments, fillets, radius, min_turn_angle, clamp, merge_tolerance)
+        results.append((kept, corners, adjustments, runs,
+                        unique(added, lambda corner: (corner.x, corner.y)),
+                        unique(updated, lambda pair: (pair[1].x, pair[1].y)),
+                        unique(removed, lambda fillet: (fillet.x, fillet.y))))
+    return results
@@ -0,0 +1,294 @@
+"""Stores the geometry of a sketch in a compact binary file that can be analysed without Fusion.
+
+A snapshot starts with a header and a table of sections, followed by the sections
+themselves. Every section is a fixed width array of little endian int32 or float64
+values, so the loader can memory map the file and read the sections in place.
+
+    header    magic b'ZSKS', version uint16, reserved uint16, section count uint32
+    table     one entry per section: name 4s, type code 1s, 3 pad bytes,
+              values per record uint32, offset uint64, record count uint64, 4 pad bytes
+    sections  each one starts on an 8 byte boundary
+
+Loaders skip sections they don't know, so sections can be added without a new
+version. This module only uses the standard library. To run the corner analysis
+from Add Rads to Sketch on snapshots:
+
+    python lib/fusion360utils/sketch_snapshot.py --radius 0.1 <snapshot> [<snapshot> ...]
+"""
+
+import argparse
+import array
+import math
+import mmap
+import struct
+import sys
+import time
+
+try:
+    from . import sketch_geometry as geometry
+except ImportError:
+    import sketch_geometry as geometry
+
+MAGIC = b'ZSKS'
+FORMAT_VERSION = 2
+
+_HEADER = struct.Struct('<4sHHI')
+_ENTRY = struct.Struct('<4s1s3xIQQ4x')
+
+# The kinds of curve in the CKND section.
+KIND_LINE = 0
+KIND_ARC = 1
+KIND_SPLINE = 2
+KIND_OTHER = 3
+
+# (section name, attribute, type code, values per record) for every section in a snapshot.
+SECTIONS = (
+    ('NAME', 'name_bytes', 'B', 1),       # The sketch name in UTF-8.
+    ('PNTS', 'points', 'd', 3),           # x, y, z of each sketch point.
+    ('CKND', 'curve_kinds', 'i', 1),      # The KIND_* of each curve.
+    ('CPTS', 'curve_points', 'i', 2),     # The start and end point index of each curve, -1 if it has none.
+    ('CGEO', 'curve_geometry', 'd', 8),   # x0, y0, x1, y1, centre x, centre y, radius, unused.
+    ('CTAG', 'curve_tags', 'd', 3),       # Corner x, y and radius of fillets added by Add Rads to Sketch, NaN otherwise.
+    ('SIDX', 'spline_ranges', 'i', 2),    # The first control point and control point count of each curve.
+    ('SPTS', 'spline_points', 'd', 3),    # x, y, z of each spline control point.
+    ('LOFF', 'loop_offsets', 'i', 1),     # Where each loop starts in LCRV and LSEG, with the total at the end.
+    ('LCRV', 'loop_curves', 'i', 1),      # The curve index of each segment of each loop.
+    ('LSEG', 'loop_segments', 'd', 4),    # x0, y0, x1, y1 of each segment, trimmed to the profile.
+)
+
+_TYPE_SIZES = {'B': 1, 'i': 4, 'd': 8}
+
+
+class SketchData:
+    """The geometry of a sketch as flat lists, ready to be written with write_snapshot.
+
+    Each attribute is named after a section in SECTIONS and holds its records one
+    after the other, so a curve's geometry is curve_geometry[i * 8:i * 8 + 8].
+    """
+
+    def __init__(self, name: str = ''):
+        self.name = name
+        for _, attribute, _, _ in SECTIONS[1:]:
+            setattr(self, attribute, [])
+        self.loop_offsets.append(0)
+
+    def add_point(self, x: float, y: float, z: float = 0.0) -> int:
+        self.points.extend((x, y, z))
+        return len(self.points) // 3 - 1
+
+    def add_curve(self, kind: int, start: int, end: int, x0: float, y0: float, x1: float, y1: float,
+                  cx: float = 0.0, cy: float = 0.0, radius: float = 0.0, control_points: list = (), tag: tuple = None) -> int:
+        """Adds a curve and returns its index.
+
+        Arguments:
+        kind -- One of the KIND_* constants.
+        start, end -- The indices of the curve's end points, or -1.
+        x0, y0, x1, y1 -- The end points of the curve.
+        cx, cy, radius -- The centre and radius of arcs.
+        control_points -- The (x, y, z) control points of splines.
+        tag -- The (corner x, corner y, radius) stored on fillets added by Add Rads to Sketch.
+        """
+        self.curve_kinds.append(kind)
+        self.curve_points.extend((start, end))
+        self.curve_geometry.extend((x0, y0, x1, y1, cx, cy, radius, 0.0))
+        self.curve_tags.extend(tag if tag else (math.nan, math.nan, math.nan))
+        self.spline_ranges.extend((len(self.spline_points) // 3, len(control_points)))
+        for point in control_points:
+            self.spline_points.extend(point)
+        return len(self.curve_kinds) - 1
+
+    def add_loop(self, curves: list, segments: list):
+        """Adds a loop.
+
+        Arguments:
+        curves -- The index of the curve each segment of the loop lies on.
+        segments -- The (x0, y0, x1, y1) end points of each segment.
+        """
+        self.loop_curves.extend(curves)
+        for segment in segments:
+            self.loop_segments.extend(segment)
+        self.loop_offsets.append(len(self.loop_curves))
+
+
+def write_snapshot(path: str, data: SketchData):
+    """Writes a sketch to a snapshot file."""
+    data.name_bytes = list(data.name.encode('utf-8'))
+    payloads = []
+    for name, attribute, type_code, width in SECTIONS:
+        values = array.array(type_code, getattr(data, attribute))
+        if values.itemsize != _TYPE_SIZES[type_code]:
+            raise RuntimeError(f'Snapshots need {_TYPE_SIZES[type_code]} byte {type_code} values')
+        if sys.byteorder != 'little':
+            values.byteswap()
+        payloads.append((name, type_code, width, len(values) // width, values.tobytes()))
+
+    offset = _align(_HEADER.size + _ENTRY.size * len(payloads))
+    entries = []
+    for name, type_code, width, count, payload in payloads:
+        entries.append(_ENTRY.pack(name.encode('ascii'), type_code.encode('ascii'), width, offset, count))
+        offset = _align(offset + len(payload))
+
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(payloads)))
+        for entry in entries:
+            file.write(entry)
+        for _, _, _, _, payload in payloads:
+            file.write(b'\0' * (_align(file.tell()) - file.tell()))
+            file.write(payload)
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class SketchSnapshot:
+    """A snapshot file mapped into memory.
+
+    The attributes named in SECTIONS are flat memoryviews over the mapped file, so
+    loading a snapshot doesn't copy or parse its geometry. Close the snapshot, or use
+    it in a with statement, to release the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        try:
+            self._load()
+        except:
+            self.close()
+            raise
+
+    def _load(self):
+        magic, version, _, section_count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{self.path} is not a sketch snapshot')
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported sketch snapshot version {version} in {self.path}')
+
+        found = {}
+        for i in range(section_count):
+            name, type_code, width, offset, count = _ENTRY.unpack_from(self._map, _HEADER.size + i * _ENTRY.size)
+            found[name.decode('ascii')] = (type_code.decode('ascii'), width, offset, count)
+
+        whole = memoryview(self._map)
+        self._views.append(whole)
+        for name, attribute, type_code, width in SECTIONS:
+            if name not in found:
+                setattr(self, attribute, array.array(type_code))
+                continue
+            stored_type, stored_width, offset, count = found[name]
+            if stored_type != type_code or stored_width != width:
+                raise ValueError(f'Section {name} in {self.path} has an unexpected layout')
+
+            view = whole[offset:offset + count * width * _TYPE_SIZES[type_code]]
+            if sys.byteorder != 'little':
+                # Only big endian machines pay for a copy.
+                values = array.array(type_code, view.tobytes())
+                values.byteswap()
+                view.release()
+            else:
+                values = view.cast(type_code)
+                self._views.extend((view, values))
+            setattr(self, attribute, values)
+
+        self.name = bytes(self.name_bytes).decode('utf-8')
+
+    def close(self):
+        # Views have to be released before the map they point into can be closed.
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def point_count(self) -> int:
+        return len(self.points) // 3
+
+    @property
+    def curve_count(self) -> int:
+        return len(self.curve_kinds)
+
+    @property
+    def loop_count(self) -> int:
+        return len(self.loop_offsets) - 1
+
+    def curve_control_points(self, index: int) -> list:
+        """Returns the (x, y, z) control points of a spline."""
+        first, count = self.spline_ranges[index * 2], self.spline_ranges[index * 2 + 1]
+        points = self.spline_points
+        return [(points[i * 3], points[i * 3 + 1], points[i * 3 + 2]) for i in range(first, first + count)]
+
+    def loop_geometry(self, index: int) -> tuple:
+        """Returns a loop as the segments and fillets that sketch_geometry.plan_loop works on.
+
+        :returns:
+            (segments, fillets) where segments are Segment tuples and fillets are Fillet
+            tuples for the arcs that were tagged by Add Rads to Sketch.
+        """
+        segments = []
+        fillets = []
+        kinds = self.curve_kinds
+        tags = self.curve_tags
+        ends = self.loop_segments
+        start, end = self.loop_offsets[index], self.loop_offsets[index + 1]
+        for position, i in enumerate(range(start, end)):
+            curve = self.loop_curves[i]
+            if not 0 <= curve < self.curve_count:
+                raise ValueError(f'Loop {index} in {self.path} refers to curve {curve}, which does not exist')
+            kind = geometry.LINE if kinds[curve] == KIND_LINE else geometry.CURVE
+            segments.append(geometry.Segment(kind, ends[i * 4], ends[i * 4 + 1], ends[i * 4 + 2], ends[i * 4 + 3]))
+
+            radius = tags[curve * 3 + 2]
+            if not math.isnan(radius):
+                fillets.append(geometry.Fillet(position, geometry.corner_key(tags[curve * 3], tags[curve * 3 + 1]), radius))
+        return segments, fillets
+
+
+def analyse_snapshot(snapshot: SketchSnapshot, radius: float, min_turn_angle: float = math.radians(1),
+                     clamp: bool = True, merge_tolerance: float = 0) -> list:
+    """Runs the Add Rads to Sketch corner analysis on every loop of a snapshot.
+
+    :returns:
+        A list with the result of sketch_geometry.plan_loop for each loop, with the corners
+        shared by neighbouring loops only planned once, see sketch_geometry.plan_sketch.
+    """
+    loops = [snapshot.loop_geometry(i) for i in range(snapshot.loop_count)]
+    return geometry.plan_sketch(loops, radius, min_turn_angle, clamp, merge_tolerance)
+
+
+def main(argv: list):
+    parser = argparse.ArgumentParser(description='Runs the Add Rads to Sketch corner analysis on sketch snapshots.')
+    parser.add_argument('snapshots', nargs='+')
+    parser.add_argument('--radius', type=float, default=0.1, help='The fillet radius in cm.')
+    parser.add_argument('--min-angle', type=float, default=1.0, help='The minimum turn angle in degrees.')
+    parser.add_argument('--no-clamp', action='store_true', help='Skip fillets that do not fit instead of reducing them.')
+    parser.add_argument('--merge-tolerance', type=float, default=0.0, help='Merge nearly collinear lines within this distance in cm.')
+    args = parser.parse_args(argv[1:])
+
+    print(f'{"sketch":<32} {"curves":>8} {"loops":>6} {"add":>6} {"update":>6} {"remove":>6} {"load ms":>8} {"plan ms":>8}')
+    for path in args.snapshots:
+        start = time.perf_counter()
+        with SketchSnapshot(path) as snapshot:
+            loaded = time.perf_counter()
+            results = analyse_snapshot(snapshot, args.radius, math.radians(args.min_angle), not args.no_clamp,
+                                       args.merge_tolerance)
+            planned = time.perf_counter()
+            added = sum(len(result[4]) for result in results)
+            updated = sum(len(result[5]) for result in results)
+            removed = sum(len(result[6]) for result in results)
+            print(f'{snapshot.name[:32]:<32} {snapshot.curve_count:>8} {snapshot.loop_count:>6} {added:>6} {updated:>6} '
+                  f'{removed:>6} {(loaded - start) * 1000:>8.2f} {(planned - loaded) * 1000:>8.2f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,145 @@
+import itertools
+import math
+import os
+import random
+import sys
+import unittest
+
+# bvh only uses the standard library, so it is imported on its own without Fusion.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'commands', 'rotateCommand'))
+
+import bvh
+
+
+def matrix(rotation: list, translation: tuple = (0.0, 0.0, 0.0)) -> list:
+    """Returns a row major 4x4 transform from a 3x3 rotation and a translation."""
+    return [*rotation[0], translation[0], *rotation[1], translation[1], *rotation[2], translation[2], 0.0, 0.0, 0.0, 1.0]
+
+
+def rotation(axis: tuple, angle: float) -> list:
+    """Returns the 3x3 rotation about a unit axis."""
+    x, y, z = axis
+    c = math.cos(angle)
+    s = math.sin(angle)
+    t = 1 - c
+    return [[t * x * x + c, t * x * y - s * z, t * x * z + s * y],
+            [t * x * y + s * z, t * y * y + c, t * y * z - s * x],
+            [t * x * z - s * y, t * y * z + s * x, t * z * z + c]]
+
+
+def random_box(rng: random.Random, size: float = 1.0) -> tuple:
+    x, y, z = rng.uniform(0, 10), rng.uniform(0, 10), rng.uniform(0, 10)
+    return (x, y, z, x + rng.uniform(0, size), y + rng.uniform(0, size), z + rng.uniform(0, size))
+
+
+IDENTITY = matrix([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+
+
+class TransformBoxTest(unittest.TestCase):
+    def assertBoxAlmostEqual(self, first: tuple, second: tuple):
+        self.assertEqual(len(first), 6)
+        for a, b in zip(first, second):
+            self.assertAlmostEqual(a, b)
+
+    def test_identity(self):
+        box = (0.0, 0.0, 0.0, 1.0, 2.0, 3.0)
+        self.assertBoxAlmostEqual(bvh.transform_box(box, IDENTITY), box)
+
+    def test_translation(self):
+        transform = matrix([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]], (1.0, -2.0, 3.0))
+        self.assertBoxAlmostEqual(bvh.transform_box((0.0, 0.0, 0.0, 1.0, 2.0, 3.0), transform),
+                                  (1.0, -2.0, 3.0, 2.0, 0.0, 6.0))
+
+    def test_quarter_turn(self):
+        transform = matrix(rotation((0.0, 0.0, 1.0), math.pi / 2))
+        self.assertBoxAlmostEqual(bvh.transform_box((0.0, 0.0, 0.0, 1.0, 2.0, 3.0), transform),
+                                  (-2.0, 0.0, 0.0, 0.0, 1.0, 3.0))
+
+    def test_matches_transformed_corners(self):
+        rng = random.Random(1)
+        for _ in range(50):
+            axis = (rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-1, 1))
+            length = math.sqrt(sum(a * a for a in axis))
+            rotated = rotation(tuple(a / length for a in axis), rng.uniform(0, 2 * math.pi))
+            translation = (rng.uniform(-5, 5), rng.uniform(-5, 5), rng.uniform(-5, 5))
+            box = random_box(rng, 3.0)
+
+            corners = []
+            for corner in itertools.product(*((box[i], box[i + 3]) for i in range(3))):
+                corners.append([sum(rotated[row][column] * corner[column] for column in range(3)) + translation[row]
+                                for row in range(3)])
+            expected = tuple(min(c[i] for c in corners) for i in range(3)) + \
+                tuple(max(c[i] for c in corners) for i in range(3))
+
+            self.assertBoxAlmostEqual(bvh.transform_box(box, matrix(rotated, translation)), expected)
+
+
+class OverlapsTest(unittest.TestCase):
+    def test_touching_boxes_overlap(self):
+        self.assertTrue(bvh.overlaps((0, 0, 0, 1, 1, 1), (1, 0, 0, 2, 1, 1)))
+
+    def test_tolerance(self):
+        a = (0, 0, 0, 1, 1, 1)
+        b = (1.5, 0, 0, 2, 1, 1)
+        self.assertFalse(bvh.overlaps(a, b))
+        self.assertFalse(bvh.overlaps(a, b, 0.4))
+        self.assertTrue(bvh.overlaps(a, b, 0.5))
+        self.assertTrue(bvh.overlaps(b, a, 0.5))
+
+    def test_apart_on_one_axis(self):
+        self.assertFalse(bvh.overlaps((0, 0, 0, 1, 1, 1), (0, 0, 2, 1, 1, 3)))
+
+
+class BuildBvhTest(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(bvh.build_bvh([]), [])
+        self.assertEqual(bvh.query([], [], (0, 0, 0, 1, 1, 1)), [])
+        self.assertEqual(bvh.find_candidate_pairs([(0, 0, 0, 1, 1, 1)], []), [])
+
+    def test_every_box_is_in_one_leaf(self):
+        rng = random.Random(2)
+        boxes = [random_box(rng) for _ in range(101)]
+        nodes = bvh.build_bvh(boxes)
+
+        items = [i for node in nodes if node.left < 0 for i in node.items]
+        self.assertEqual(sorted(items), list(range(len(boxes))))
+        for node in nodes:
+            self.assertLessEqual(len(node.items), bvh.LEAF_SIZE)
+
+    def test_nodes_contain_their_boxes(self):
+        rng = random.Random(3)
+        boxes = [random_box(rng) for _ in range(40)]
+        nodes = bvh.build_bvh(boxes)
+
+        for node in nodes:
+            if node.left < 0:
+                inner = [boxes[i] for i in node.items]
+            else:
+                inner = [nodes[node.left].box, nodes[node.right].box]
+            for box in inner:
+                self.assertTrue(all(node.box[i] <= box[i] and box[i + 3] <= node.box[i + 3] for i in range(3)))
+
+
+class FindCandidatePairsTest(unittest.TestCase):
+    def brute_force(self, moved: list, others: list, tolerance: float) -> list:
+        return sorted((i, j) for i, a in enumerate(moved) for j, b in enumerate(others)
+                      if bvh.overlaps(a, b, tolerance))
+
+    def test_matches_brute_force(self):
+        rng = random.Random(4)
+        moved = [random_box(rng, 2.0) for _ in range(30)]
+        others = [random_box(rng, 2.0) for _ in range(200)]
+
+        for tolerance in (0.0, 0.25):
+            with self.subTest(tolerance=tolerance):
+                expected = self.brute_force(moved, others, tolerance)
+                self.assertTrue(expected)
+                self.assertEqual(sorted(bvh.find_candidate_pairs(moved, others, tolerance)), expected)
+
+    def test_single_box(self):
+        self.assertEqual(bvh.find_candidate_pairs([(0, 0, 0, 1, 1, 1)], [(0.5, 0.5, 0.5, 2, 2, 2)]), [(0, 0)])
+        self.assertEqual(bvh.find_candidate_pairs([(0, 0, 0, 1, 1, 1)], [(3, 3, 3, 4, 4, 4)]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,251 @@
+import math
+import os
+import sys
+import unittest
+
+# sketch_geometry only uses the standard library, so it is imported on its own without Fusion.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib', 'fusion360utils'))
+
+import sketch_geometry as geometry
+
+
+def polygon(points: list) -> list:
+    """Returns the closed loop of lines through the points."""
+    return [geometry.Segment(geometry.LINE, *points[i], *points[(i + 1) % len(points)]) for i in range(len(points))]
+
+
+SQUARE = [(0.0, 0.0), (2.0, 0.0), (2.0, 2.0), (0.0, 2.0)]
+
+
+class FitCornersTest(unittest.TestCase):
+    def test_square_corners_fit(self):
+        segments = polygon(SQUARE)
+        corners = geometry.plan_corners(segments, 0.1)
+        self.assertEqual([corner.index for corner in corners], [0, 1, 2, 3])
+        for corner in corners:
+            self.assertAlmostEqual(corner.turn_angle, math.pi / 2)
+
+        fitted, adjustments = geometry.fit_corners(segments, corners)
+        self.assertEqual(fitted, corners)
+        self.assertEqual(adjustments, [])
+
+    def test_corner_between_last_and_first_segment(self):
+        corners = geometry.plan_corners(polygon(SQUARE), 0.1)
+        self.assertEqual((corners[-1].x, corners[-1].y), (0.0, 0.0))
+
+    def test_collinear_corners_are_skipped(self):
+        segments = polygon([(0.0, 0.0), (1.0, 0.0), (2.0, 0.0), (2.0, 2.0), (0.0, 2.0)])
+        corners = geometry.plan_corners(segments, 0.1)
+        self.assertEqual([corner.index for corner in corners], [1, 2, 3, 4])
+
+    def test_clamps_on_short_segments(self):
+        # The short sides are shared by two fillets that each need 0.1 of them.
+        segments = polygon([(0.0, 0.0), (2.0, 0.0), (2.0, 0.1), (0.0, 0.1)])
+        corners = geometry.plan_corners(segments, 0.1)
+        fitted, adjustments = geometry.fit_corners(segments, corners, clamp=True)
+
+        self.assertEqual(len(fitted), 4)
+        self.assertEqual(len(adjustments), 4)
+        for corner, adjustment in zip(fitted, adjustments):
+            self.assertEqual(adjustment.reason, 'clamped to fit')
+            self.assertEqual(adjustment.requested, 0.1)
+            self.assertAlmostEqual(corner.radius, 0.1 * 0.99 / 2)
+            self.assertAlmostEqual(adjustment.radius, corner.radius)
+
+    def test_skips_on_short_segments_without_clamp(self):
+        segments = polygon([(0.0, 0.0), (2.0, 0.0), (2.0, 0.1), (0.0, 0.1)])
+        corners = geometry.plan_corners(segments, 0.1)
+        fitted, adjustments = geometry.fit_corners(segments, corners, clamp=False)
+
+        self.assertEqual(fitted, [])
+        self.assertEqual([adjustment.reason for adjustment in adjustments], ['segments too short'] * 4)
+        self.assertEqual([adjustment.radius for adjustment in adjustments], [0.0] * 4)
+
+    def test_only_the_corners_at_a_short_segment_are_clamped(self):
+        segments = polygon([(0.0, 0.0), (2.0, 0.0), (2.0, 2.0), (1.0, 2.0), (1.0, 2.1), (0.0, 2.1)])
+        corners = geometry.plan_corners(segments, 0.1)
+        fitted, adjustments = geometry.fit_corners(segments, corners)
+
+        self.assertEqual(len(fitted), 6)
+        self.assertEqual(sorted(adjustment.index for adjustment in adjustments), [2, 3])
+        self.assertEqual([corner.radius for corner in fitted if corner.index not in (2, 3)], [0.1] * 4)
+
+    def test_share(self):
+        self.assertAlmostEqual(geometry._share(1.0, 0.3, 0.2), 0.8)
+        self.assertAlmostEqual(geometry._share(1.0, 0.6, 0.6), 0.5)
+        self.assertAlmostEqual(geometry._share(1.0, 0.9, 0.3), 0.75)
+        self.assertEqual(geometry._share(1.0, 0.5, math.inf), 0.0)
+        self.assertAlmostEqual(geometry._share(1.0, math.inf, 0.3), 0.7)
+
+
+class CollinearRunsTest(unittest.TestCase):
+    def test_finds_a_run(self):
+        segments = polygon([(0.0, 0.0), (0.7, 0.0001), (1.3, -0.0001), (2.0, 0.0), (2.0, 2.0), (0.0, 2.0)])
+        runs = geometry.find_collinear_runs(segments, 0.001)
+        self.assertEqual(runs, [geometry.Run(0, 3, 0.0, 0.0, 2.0, 0.0)])
+
+    def test_points_outside_the_tolerance_are_kept(self):
+        segments = polygon([(0.0, 0.0), (1.0, 0.01), (2.0, 0.0), (2.0, 2.0), (0.0, 2.0)])
+        self.assertEqual(geometry.find_collinear_runs(segments, 0.001), [])
+        self.assertEqual(len(geometry.find_collinear_runs(segments, 0.1)), 1)
+
+    def test_no_runs_without_a_tolerance(self):
+        segments = polygon([(0.0, 0.0), (1.0, 0.0), (2.0, 0.0), (2.0, 2.0), (0.0, 2.0)])
+        self.assertEqual(geometry.find_collinear_runs(segments, 0), [])
+
+    def test_run_wraps_around_the_end_of_the_loop(self):
+        segments = polygon([(1.0, 0.0), (2.0, 0.0), (2.0, 2.0), (0.0, 2.0), (0.0, 0.0)])
+        runs = geometry.find_collinear_runs(segments, 0.001)
+        self.assertEqual(runs, [geometry.Run(4, 2, 0.0, 0.0, 2.0, 0.0)])
+
+        self.assertEqual(geometry.merged_index_map(runs, len(segments)), {1: 0, 2: 1, 3: 2, 4: 3})
+        merged = geometry.merge_runs(segments, runs)
+        self.assertEqual(merged, polygon([(2.0, 0.0), (2.0, 2.0), (0.0, 2.0), (0.0, 0.0)]))
+
+    def test_runs_stop_at_curves(self):
+        segments = polygon([(0.0, 0.0), (1.0, 0.0), (2.0, 0.0), (3.0, 0.0), (3.0, 2.0), (0.0, 2.0)])
+        self.assertEqual(geometry.find_collinear_runs(segments, 0.001), [geometry.Run(0, 3, 0.0, 0.0, 3.0, 0.0)])
+
+        segments[1] = segments[1]._replace(kind=geometry.CURVE)
+        self.assertEqual(geometry.find_collinear_runs(segments, 0.001), [])
+
+    def test_loop_without_sharp_corners(self):
+        # A 36 sided polygon turns 10 degrees at every corner, so it is one chain all the way round.
+        points = [(math.cos(i * math.pi / 18), math.sin(i * math.pi / 18)) for i in range(36)]
+        segments = polygon(points)
+        self.assertEqual(geometry.find_collinear_runs(segments, 1e-6), [])
+
+        runs = geometry.find_collinear_runs(segments, 0.1)
+        self.assertTrue(runs)
+        merged = geometry.merge_runs(segments, runs)
+        self.assertEqual(len(merged), len(segments) - sum(run.count - 1 for run in runs))
+        for first, second in zip(merged, merged[1:] + merged[:1]):
+            self.assertAlmostEqual(math.hypot(first.x1 - second.x0, first.y1 - second.y0), 0.0)
+
+    def test_merged_runs_with_existing_fillets(self):
+        # The bottom edge is split in two and the corner at (2, 2) was filleted by an earlier run.
+        segments = [
+            geometry.Segment(geometry.LINE, 0.0, 0.0, 1.0, 0.0),
+            geometry.Segment(geometry.LINE, 1.0, 0.0, 2.0, 0.0),
+            geometry.Segment(geometry.LINE, 2.0, 0.0, 2.0, 1.9),
+            geometry.Segment(geometry.CURVE, 2.0, 1.9, 1.9, 2.0),
+            geometry.Segment(geometry.LINE, 1.9, 2.0, 0.0, 2.0),
+            geometry.Segment(geometry.LINE, 0.0, 2.0, 0.0, 0.0),
+        ]
+        fillets = [geometry.Fillet(3, geometry.corner_key(2.0, 2.0), 0.1)]
+        kept, corners, adjustments, runs, added, updated, removed = geometry.plan_loop(
+            segments, fillets, 0.1, math.radians(1), True, 0.001)
+
+        self.assertEqual(runs, [geometry.Run(0, 2, 0.0, 0.0, 2.0, 0.0)])
+        # kept refers to the merged loop, where the arc moved from 3 to 2.
+        self.assertEqual(kept, [0, 1, 3, 4])
+        self.assertEqual(len(corners), 4)
+        self.assertEqual(sorted((corner.x, corner.y) for corner in added), [(0.0, 0.0), (0.0, 2.0), (2.0, 0.0)])
+        self.assertEqual(updated, [])
+        self.assertEqual(removed, [])
+
+
+def filleted_polygon(points: list, radius: float) -> tuple:
+    """Returns the loop through the points with every corner filleted the way Add Rads to Sketch leaves it.
+
+    :returns:
+        (segments, fillets) with a CURVE segment for each arc and a Fillet tagging it.
+    """
+    count = len(points)
+    trims = []
+    for i in range(count):
+        corner = points[i]
+        before = points[i - 1]
+        after = points[(i + 1) % count]
+        u = (corner[0] - before[0], corner[1] - before[1])
+        v = (after[0] - corner[0], after[1] - corner[1])
+        angle = geometry.turn_angle(corner, before, after)
+        tangent = radius / math.tan((math.pi - angle) / 2)
+        lu = math.hypot(*u)
+        lv = math.hypot(*v)
+        trims.append(((corner[0] - u[0] / lu * tangent, corner[1] - u[1] / lu * tangent),
+                      (corner[0] + v[0] / lv * tangent, corner[1] + v[1] / lv * tangent)))
+
+    segments = []
+    fillets = []
+    for i in range(count):
+        start = trims[i][1]
+        end = trims[(i + 1) % count][0]
+        segments.append(geometry.Segment(geometry.LINE, *start, *end))
+        fillets.append(geometry.Fillet(len(segments), geometry.corner_key(*points[(i + 1) % count]), radius))
+        segments.append(geometry.Segment(geometry.CURVE, *end, *trims[(i + 1) % count][1]))
+    return segments, fillets
+
+
+class IncrementalFilletTest(unittest.TestCase):
+    def test_collapse_fillets(self):
+        segments, fillets = filleted_polygon(SQUARE, 0.1)
+        collapsed, kept, placed = geometry.collapse_fillets(segments, fillets)
+
+        self.assertEqual(kept, [0, 2, 4, 6])
+        for segment, expected in zip(collapsed, polygon(SQUARE)):
+            for value, expected_value in zip(segment[1:], expected[1:]):
+                self.assertAlmostEqual(value, expected_value)
+
+        # The arc after line i rounds the corner between kept lines i and i + 1.
+        self.assertEqual([fillet.index for fillet in placed], [0, 1, 2, 3])
+        for fillet, point in zip(placed, SQUARE[1:] + SQUARE[:1]):
+            self.assertAlmostEqual(fillet.x, point[0])
+            self.assertAlmostEqual(fillet.y, point[1])
+
+    def test_arcs_that_are_not_between_lines_stay(self):
+        segments, fillets = filleted_polygon(SQUARE, 0.1)
+        segments[2] = segments[2]._replace(kind=geometry.CURVE)
+        collapsed, kept, placed = geometry.collapse_fillets(segments, fillets)
+        self.assertEqual(kept, [0, 1, 2, 3, 4, 6])
+        self.assertEqual([fillet.segment for fillet in placed], [5, 7])
+
+    def test_first_run_adds_every_corner(self):
+        kept, corners, adjustments, runs, added, updated, removed = geometry.plan_loop(
+            polygon(SQUARE), [], 0.1, math.radians(1), True)
+        self.assertEqual(len(added), 4)
+        self.assertEqual((updated, removed), ([], []))
+
+    def test_run_again_changes_nothing(self):
+        segments, fillets = filleted_polygon(SQUARE, 0.1)
+        kept, corners, adjustments, runs, added, updated, removed = geometry.plan_loop(
+            segments, fillets, 0.1, math.radians(1), True)
+        self.assertEqual(len(corners), 4)
+        self.assertEqual((added, updated, removed), ([], [], []))
+
+    def test_radius_change_updates_every_fillet(self):
+        segments, fillets = filleted_polygon(SQUARE, 0.1)
+        kept, corners, adjustments, runs, added, updated, removed = geometry.plan_loop(
+            segments, fillets, 0.2, math.radians(1), True)
+        self.assertEqual((added, removed), ([], []))
+        self.assertEqual(len(updated), 4)
+        for fillet, corner in updated:
+            self.assertEqual(fillet.radius, 0.1)
+            self.assertEqual(corner.radius, 0.2)
+            self.assertAlmostEqual(math.hypot(fillet.x - corner.x, fillet.y - corner.y), 0.0)
+
+    def test_moved_corner_is_updated(self):
+        segments, fillets = filleted_polygon(SQUARE, 0.1)
+        fillets[0] = fillets[0]._replace(key=geometry.corner_key(2.0, 0.5))
+        kept, corners, adjustments, runs, added, updated, removed = geometry.plan_loop(
+            segments, fillets, 0.1, math.radians(1), True)
+        self.assertEqual((added, removed), ([], []))
+        self.assertEqual([fillet.segment for fillet, _ in updated], [1])
+
+    def test_fillets_on_skipped_corners_are_removed(self):
+        segments, fillets = filleted_polygon(SQUARE, 0.1)
+        kept, corners, adjustments, runs, added, updated, removed = geometry.plan_loop(
+            segments, fillets, 0.1, math.radians(100), True)
+        self.assertEqual((added, updated), ([], []))
+        self.assertEqual(sorted(fillet.segment for fillet in removed), [1, 3, 5, 7])
+
+    def test_rounding_of_the_key_is_not_a_change(self):
+        points = [(0.0, 0.0), (2.000004, 0.0), (2.000004, 2.0), (0.0, 2.0)]
+        segments, fillets = filleted_polygon(points, 0.1)
+        kept, corners, adjustments, runs, added, updated, removed = geometry.plan_loop(
+            segments, fillets, 0.1, math.radians(1), True)
+        self.assertEqual((added, updated, removed), ([], [], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
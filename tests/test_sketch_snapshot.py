@@ -0,0 +1,117 @@
+import math
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+# sketch_snapshot only uses the standard library, so it is imported on its own without Fusion.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib', 'fusion360utils'))
+
+import sketch_geometry as geometry
+import sketch_snapshot as snapshots
+
+
+def square_data(data: snapshots.SketchData, x: float, y: float, size: float) -> list:
+    """Adds the points, lines and loop of a square to a sketch and returns the loop's curves."""
+    corners = [(x, y), (x + size, y), (x + size, y + size), (x, y + size)]
+    points = [data.add_point(*corner) for corner in corners]
+    curves = []
+    segments = []
+    for i in range(4):
+        (x0, y0), (x1, y1) = corners[i], corners[(i + 1) % 4]
+        curves.append(data.add_curve(snapshots.KIND_LINE, points[i], points[(i + 1) % 4], x0, y0, x1, y1))
+        segments.append((x0, y0, x1, y1))
+    data.add_loop(curves, segments)
+    return curves
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'sketch.zsks')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        data = snapshots.SketchData('Skizze ü')
+        a = data.add_point(0.0, 0.0)
+        b = data.add_point(2.0, 0.0, 0.5)
+        data.add_curve(snapshots.KIND_LINE, a, b, 0.0, 0.0, 2.0, 0.0)
+        data.add_curve(snapshots.KIND_ARC, b, -1, 2.0, 0.0, 2.1, 0.1, 2.0, 0.1, 0.1, tag=(2.1, 0.0, 0.1))
+        control_points = [(0.0, 0.0, 0.0), (1.0, 1.0, 0.0), (2.0, 0.0, 0.0)]
+        data.add_curve(snapshots.KIND_SPLINE, -1, -1, 0.0, 0.0, 2.0, 0.0, control_points=control_points)
+        data.add_loop([0, 1], [(0.0, 0.0, 2.0, 0.0), (2.0, 0.0, 2.1, 0.1)])
+        snapshots.write_snapshot(self.path, data)
+
+        with snapshots.SketchSnapshot(self.path) as snapshot:
+            self.assertEqual(snapshot.name, 'Skizze ü')
+            self.assertEqual((snapshot.point_count, snapshot.curve_count, snapshot.loop_count), (2, 3, 1))
+            self.assertEqual(list(snapshot.points), [0.0, 0.0, 0.0, 2.0, 0.0, 0.5])
+            self.assertEqual(list(snapshot.curve_kinds), [snapshots.KIND_LINE, snapshots.KIND_ARC, snapshots.KIND_SPLINE])
+            self.assertEqual(list(snapshot.curve_points), [a, b, b, -1, -1, -1])
+            self.assertEqual(list(snapshot.curve_geometry[8:16]), [2.0, 0.0, 2.1, 0.1, 2.0, 0.1, 0.1, 0.0])
+            self.assertTrue(math.isnan(snapshot.curve_tags[0]))
+            self.assertEqual(snapshot.curve_control_points(0), [])
+            self.assertEqual(snapshot.curve_control_points(2), control_points)
+
+            segments, fillets = snapshot.loop_geometry(0)
+            self.assertEqual(segments, [geometry.Segment(geometry.LINE, 0.0, 0.0, 2.0, 0.0),
+                                        geometry.Segment(geometry.CURVE, 2.0, 0.0, 2.1, 0.1)])
+            self.assertEqual(fillets, [geometry.Fillet(1, geometry.corner_key(2.1, 0.0), 0.1)])
+
+    def test_empty_sketch(self):
+        snapshots.write_snapshot(self.path, snapshots.SketchData())
+        with snapshots.SketchSnapshot(self.path) as snapshot:
+            self.assertEqual((snapshot.name, snapshot.point_count, snapshot.curve_count, snapshot.loop_count),
+                             ('', 0, 0, 0))
+            self.assertEqual(snapshots.analyse_snapshot(snapshot, 0.1), [])
+
+    def test_shared_corners_are_planned_once(self):
+        data = snapshots.SketchData('Squares')
+        square_data(data, 0.0, 0.0, 2.0)
+        square_data(data, 0.0, 0.0, 2.0)
+        snapshots.write_snapshot(self.path, data)
+
+        with snapshots.SketchSnapshot(self.path) as snapshot:
+            results = snapshots.analyse_snapshot(snapshot, 0.1)
+        self.assertEqual([len(result[4]) for result in results], [4, 0])
+
+    def test_neighbouring_loops(self):
+        data = snapshots.SketchData('Squares')
+        square_data(data, 0.0, 0.0, 2.0)
+        square_data(data, 2.0, 0.0, 2.0)
+        snapshots.write_snapshot(self.path, data)
+
+        with snapshots.SketchSnapshot(self.path) as snapshot:
+            results = snapshots.analyse_snapshot(snapshot, 0.1)
+        self.assertEqual(sum(len(result[4]) for result in results), 6)
+
+    def test_not_a_snapshot(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            snapshots.SketchSnapshot(self.path)
+
+    def test_other_version(self):
+        snapshots.write_snapshot(self.path, snapshots.SketchData())
+        with open(self.path, 'r+b') as file:
+            file.seek(4)
+            file.write(struct.pack('<H', snapshots.FORMAT_VERSION - 1))
+        with self.assertRaises(ValueError):
+            snapshots.SketchSnapshot(self.path)
+
+    def test_loop_with_a_missing_curve(self):
+        data = snapshots.SketchData()
+        square_data(data, 0.0, 0.0, 2.0)
+        data.loop_curves[0] = -1
+        snapshots.write_snapshot(self.path, data)
+
+        with snapshots.SketchSnapshot(self.path) as snapshot:
+            with self.assertRaises(ValueError):
+                snapshot.loop_geometry(0)
+
+
+if __name__ == '__main__':
+    unittest.main()